@@ -1,62 +1,180 @@
+import asyncio
 import random
 import json
 import logging
 import re
 import discord
 import os
+import weakref
+from fuzzymatch import FuzzyIndex, available as fuzzy_available
+from logsetup import MESSAGE_LOGGER
+from loopwatch import get_watchdog, profile_event_loop
+from metrics import CHATBOT_MATCH_SECONDS
+from outbound import PRIORITY_CHAT
+from responseindex import ResponseIndex, validate_responses
+from scheduler import get_scheduler
+
+# Per-message lines go through a sampled logger so chat volume can't flood the log
+message_log = logging.getLogger(MESSAGE_LOGGER)
+
+# Parsed and compiled response files shared by every ChatBot in the process, keyed by absolute path
+_loaded_responses = {}
+_pending_loads = {}
+# Fuzzy indexes are only built for bots that enable fuzzy matching, and go away with their ResponseIndex
+_fuzzy_indexes = weakref.WeakKeyDictionary()
+
+
+def _parse_response_file(file_path, mtime):
+    """Read, validate and compile a response file; safe to run off the event loop."""
+    with open(file_path, 'r') as f:
+        responses = json.load(f)
+    validate_responses(responses)
+    return (mtime, responses, ResponseIndex(responses))
+
+
+def _cached_response_file(file_path):
+    """Return the shared (mtime, responses, index) entry for a file if it is still current, plus its mtime."""
+    mtime = os.path.getmtime(file_path)
+    cached = _loaded_responses.get(os.path.abspath(file_path))
+    if cached and cached[0] == mtime:
+        return cached, mtime
+    return None, mtime
+
+
+def _response_index_for(responses):
+    """Return the compiled index for a responses list, reusing the one built when its file was loaded."""
+    for cached in _loaded_responses.values():
+        if cached[1] is responses:
+            return cached[2]
+    return ResponseIndex(responses)
+
+
+def _fuzzy_index_for(response_index):
+    """Return the fuzzy index for a compiled responses list, building it on first use."""
+    fuzzy_index = _fuzzy_indexes.get(response_index)
+    if fuzzy_index is None:
+        fuzzy_index = _fuzzy_indexes[response_index] = FuzzyIndex(response_index.responses)
+    return fuzzy_index
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 
 class ChatBot:
-    def __init__(self, link_channel_id):
+    def __init__(self, link_channel_id, responses_file=None, fuzzy_threshold=None):
         # Define the default response file path
         self.default_responses_file = 'responses.json'  
-        self.responses_file_path = self.default_responses_file
-        self.responses = self.load_responses(self.responses_file_path)  # Load default responses on initialization
+        self.responses_file_path = responses_file or self.default_responses_file
+        self.responses = self.load_responses(self.responses_file_path)  # Load responses on initialization
+        self.response_index = _response_index_for(self.responses)
+        self.responses_mtime = self._file_mtime(self.responses_file_path)
+        self._failed_responses_mtime = None
         self.chatbot_enabled = True  # Global chatbot status
         self.channel_status = {}  # Track channel-specific status (enabled/disabled)
         self.link_channel_id = link_channel_id  # Channel ID for sending links
+        self.outbound = None  # DiscordWriteScheduler for replies, set by the bot that owns this ChatBot
+        self.visible_jobs = []  # Scheduler jobs /CBjobs may show, filled in by the bot; other bots' jobs stay hidden
+        self.public_commands = {}  # Commands anyone can use, e.g. /busiest, registered by the bot
+        # Fuzzy matches scoring at least this are answered before the regexes are tried; None turns it off
+        self.fuzzy_threshold = fuzzy_threshold
+        if fuzzy_threshold is not None:
+            if fuzzy_available():
+                _fuzzy_index_for(self.response_index)
+            else:
+                logging.warning("Fuzzy matching needs numpy, which is not installed; using regex matching only.")
+                self.fuzzy_threshold = None
         logging.info("ChatBot initialized with default responses.")
 
     def load_responses(self, file_path=None):
         """Load responses from a JSON file, with fallback to the default responses file if loading fails."""
         file_path = file_path or self.default_responses_file
         try:
-            with open(file_path, 'r') as f:
-                responses = json.load(f)
-            logging.info(f"Loaded responses from {file_path}")
-            logging.debug(f"Responses structure: {responses}")  # Debugging line
-            return responses  # Return as a list of intents
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            # Bots sharing a response file reuse one parsed copy until the file changes
+            cached, mtime = _cached_response_file(file_path)
+            if cached is None:
+                cached = _parse_response_file(file_path, mtime)
+                _loaded_responses[os.path.abspath(file_path)] = cached
+                logging.info(f"Loaded responses from {file_path}")
+            return cached[1]  # Return as a list of intents
+        except (OSError, ValueError) as e:
             logging.error(f"Error loading responses from {file_path}: {e}")
             # Fallback to default responses if there's an error with the provided file
-            if file_path == self.default_responses_file:
+            if file_path != self.default_responses_file:
                 logging.warning(f"Falling back to default responses file: {self.default_responses_file}")
                 return self.load_responses(self.default_responses_file)  # Retry with default
             else:
                 return []  # Return empty if even default loading fails
 
+    async def reload_responses(self, file_path=None):
+        """Parse a response file in the background and swap it in only if it is valid.
+
+        The previous responses stay active if the file can't be read, parsed or compiled.
+        """
+        file_path = file_path or self.responses_file_path
+        try:
+            cached, mtime = _cached_response_file(file_path)
+            if cached is None:
+                # Bots watching the same file share one parse of each new version
+                load_key = (os.path.abspath(file_path), mtime)
+                if load_key not in _pending_loads:
+                    loop = asyncio.get_running_loop()
+                    _pending_loads[load_key] = loop.run_in_executor(None, _parse_response_file, file_path, mtime)
+                try:
+                    cached = await asyncio.shield(_pending_loads[load_key])
+                finally:
+                    _pending_loads.pop(load_key, None)
+                _loaded_responses[load_key[0]] = cached
+                logging.info(f"Reloaded responses from {file_path}")
+        except (OSError, ValueError) as e:
+            logging.error(f"Keeping current responses, failed to load {file_path}: {e}")
+            self._failed_responses_mtime = self._file_mtime(file_path)
+            return False
+
+        if self.fuzzy_threshold is not None and cached[2] not in _fuzzy_indexes:
+            # Build off the loop before the swap; if another bot on the same file got there first, keep its copy
+            fuzzy_index = await asyncio.get_running_loop().run_in_executor(None, FuzzyIndex, cached[1])
+            _fuzzy_indexes.setdefault(cached[2], fuzzy_index)
+
+        # Assigned together so a message never sees responses from one file with the index of another
+        self.responses, self.response_index = cached[1], cached[2]
+        self.responses_file_path = file_path
+        self.responses_mtime = cached[0]
+        return True
+
+    def _file_mtime(self, file_path):
+        try:
+            return os.path.getmtime(file_path)
+        except OSError:
+            return None
+
+    async def check_responses(self):
+        """Hot-reload the active response file if its mtime changed; run periodically by the scheduler."""
+        mtime = self._file_mtime(self.responses_file_path)
+        if mtime is None or mtime in (self.responses_mtime, self._failed_responses_mtime):
+            return False
+        return await self.reload_responses(self.responses_file_path)
+
     async def handle_message(self, message):
         """Handle incoming Discord messages."""
         if message.author.bot:
-            logging.info(f"Ignored message from bot: {message.content}")
+            message_log.debug("Ignored message from bot: %s", message.content)
             return  # Ignore messages from bots
 
         if message.content.startswith('/'):
-            await self.handle_command(message)
+            handler = self.public_commands.get(message.content.split(' ', 1)[0])
+            if handler is not None:
+                await handler(message)
+            else:
+                await self.handle_command(message)
             return  # Return after processing the command
 
         if not self.chatbot_enabled:
-            logging.info("Chatbot is globally disabled, ignoring message.")
+            message_log.info("Chatbot is globally disabled, ignoring message.")
             return
 
         channel_status = self.channel_status.get(message.channel.id, True)
         if not channel_status:
-            logging.info(f"Chatbot is disabled in channel: {message.channel.name}, ignoring message.")
+            message_log.info("Chatbot is disabled in channel: %s, ignoring message.", message.channel.name)
             return
 
-        logging.info(f"Handling message from {message.author}: {message.content}")
+        message_log.info("Handling message from %s: %s", message.author, message.content)
         response = self.get_response(message.content)
 
         if response is not None:
@@ -64,45 +182,63 @@ class ChatBot:
                 embed = discord.Embed(description=response.get("text", ""), color=discord.Color.blue())
                 if response.get("image"):
                     embed.set_image(url=response["image"])
-                await message.channel.send(embed=embed)
+                await self.send_reply(message.channel, embed=embed)
             else:
-                await message.channel.send(str(response))
+                await self.send_reply(message.channel, str(response))
+
+    def register_command(self, name, handler):
+        """Add a command anyone can use; handler is an async function taking the message."""
+        self.public_commands[name] = handler
+
+    async def send_reply(self, channel, content=None, embed=None):
+        """Send a chat reply, ahead of any queued dashboard updates when a write scheduler is set."""
+        if self.outbound is None:
+            return await channel.send(content, embed=embed)
+        return await self.outbound.submit(lambda: channel.send(content, embed=embed), channel.id, PRIORITY_CHAT, kind="send")
 
     def get_response(self, user_input):
         """Get a random response based on user input."""
-        user_input = user_input.lower()  # Normalize user input to lowercase
-        logging.debug(f"User input received: {user_input}")  # Log user input
+        user_input = user_input.lower()  # Lowercase once; the keyword prefilter compares against lowercase literals
+        message_log.debug("User input received: %s", user_input)  # Log user input
 
         if not isinstance(self.responses, list):
             logging.error("Responses is not a list, received: {}".format(type(self.responses)))
             return "I'm currently unable to respond."
 
-        # Check for matches in the responses list
-        for item in self.responses:
-            if isinstance(item, dict) and 'intent' in item and 'responses' in item:
-                # Check regex patterns
-                for pattern in item.get("regex", []):
-                    if re.search(pattern, user_input, re.IGNORECASE):  # Case-insensitive matching
-                        responses = item['responses']
-                        if responses:
-                            choice = random.choice(responses)
-                            # Support both dict with text/image and legacy string responses
-                            if isinstance(choice, dict):
-                                text = choice.get("text", "I don't have a response for that.")
-                                image = choice.get("image")  # Can be None
-                                logging.info(
-                                    f"Matched pattern: {pattern} for intent: {item['intent']}, response: {text}, image: {image}"
-                                )
-                                return {"text": text, "image": image}
-                            else:
-                                logging.info(
-                                    f"Matched pattern: {pattern} for intent: {item['intent']}, response: {choice}"
-                                )
-                                return {"text": choice, "image": None}
-                        else:
-                            return {"text": "I don't have a response for that.", "image": None}
+        if self.response_index.responses is not self.responses:
+            self.response_index = _response_index_for(self.responses)
+
+        # Check for matches in the compiled responses index, trying a confident fuzzy match first if enabled
+        with CHATBOT_MATCH_SECONDS.time():
+            match = None
+            if self.fuzzy_threshold is not None:
+                fuzzy_match = _fuzzy_index_for(self.response_index).match(user_input, self.fuzzy_threshold)
+                if fuzzy_match is not None:
+                    match = fuzzy_match[:2]
+            if match is None:
+                match = self.response_index.match(user_input)
+        if match is not None:
+            item, pattern = match
+            responses = item['responses']
+            if responses:
+                choice = random.choice(responses)
+                # Support both dict with text/image and legacy string responses
+                if isinstance(choice, dict):
+                    text = choice.get("text", "I don't have a response for that.")
+                    image = choice.get("image")  # Can be None
+                    message_log.info(
+                        "Matched pattern: %s for intent: %s, response: %s, image: %s", pattern, item['intent'], text, image
+                    )
+                    return {"text": text, "image": image}
+                else:
+                    message_log.info(
+                        "Matched pattern: %s for intent: %s, response: %s", pattern, item['intent'], choice
+                    )
+                    return {"text": choice, "image": None}
+            else:
+                return {"text": "I don't have a response for that.", "image": None}
 
-        logging.warning(f"No response found for user input: {user_input}")
+        message_log.info("No response found for user input: %s", user_input)
         return None
 
     async def handle_command(self, message):
@@ -139,6 +275,43 @@ class ChatBot:
             await message.channel.send(response)
             logging.info(f"CorevionBot Channel status changed for {message.channel.name}: {self.channel_status[message.channel.id]}")
 
+        elif command[0] == '/CBprofile':
+            # Sample the event loop for a few seconds (default 10, at most 60) and save the report
+            try:
+                duration = min(60.0, max(1.0, float(command[1]))) if len(command) > 1 else 10.0
+            except ValueError:
+                await message.channel.send("Usage: /CBprofile [seconds]")
+                return
+            await message.channel.send(f"Profiling for {duration:g}s...")
+            path, profiler = await profile_event_loop(duration)
+            busy = profiler.samples - profiler.idle
+            lines = [f"Profile saved to `{path}`: {busy}/{profiler.samples} samples busy."]
+            for name, samples in profiler.self_counts.most_common(5):
+                lines.append(f"`{samples:5d}` {name}")
+            slow_callbacks = get_watchdog().summary(5)
+            if slow_callbacks:
+                lines.append("Slow callbacks since start:")
+                lines.extend(f"`{count:5d}` {name}" for name, count in slow_callbacks)
+            await message.channel.send("\n".join(lines)[:2000])
+            logging.info(f"CorevionBot profiled the event loop for {duration:g}s: {path}")
+
+        elif command[0] == '/CBjobs':
+            lines = []
+            visible = set(self.visible_jobs)
+            for name, next_run, runs, failures, duration, error in get_scheduler().status():
+                if name not in visible:
+                    continue
+                when = "running" if next_run is None else f"in {next_run:.0f}s"
+                line = f"{name}: {when}, {runs} runs"
+                if duration is not None:
+                    line += f", last took {duration:.2f}s"
+                if failures:
+                    line += f", {failures} failures in its backoff group"
+                if error:
+                    line += f", last error: {error}"
+                lines.append(line)
+            await message.channel.send(("```\n" + "\n".join(lines or ["No scheduled jobs."]))[:1996] + "\n```")
+
         elif command[0] == '/botmsg':
             # Extract the message and optional image URL using regex
             if len(command) > 1:  # Ensure there are parameters after the command
@@ -198,12 +371,7 @@ class ChatBot:
 
         logging.debug(f"Attempting to load responses from {new_file_path}")
 
-        # Clear previous responses before loading new ones
-        self.responses.clear()  # Clear any existing responses
-
-        self.responses = self.load_responses(new_file_path)
-        if self.responses:
-            self.responses_file_path = new_file_path
+        if await self.reload_responses(new_file_path):
             logging.info(f"Responses file changed to {new_file_path}")
             return True
         else:
@@ -1 +1,273 @@
-python launcher.py -l ELF -b 64
+"""Supervisor that runs the bots in Bots/ across several worker processes.
+
+    python Launcher.py [--workers N] [--bots-dir Bots]
+
+Configs are split into shards (bots for the same game server or database stay together, so
+they still share one poller and one pool), each shard runs in its own process, crashed or hung
+workers are restarted with exponential backoff, and each worker's heartbeat is collected into
+data/launcher_status.json.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+from bot import bot_states, configure_logging, load_bot_configs, run_bots
+from logsetup import BOT_NAME, setup_logging
+from loopwatch import get_watchdog
+from scheduler import get_scheduler
+
+
+# ---------------- Sharding ----------------
+def shard_keys(bot_config):
+    """The resources a bot shares with others: its game server and, if a feature uses it, its database."""
+    keys = [("server", bot_config.get('server_ip'), str(bot_config.get('query_port')))]
+    webhooks = bot_config.get('webhooks', {})
+    # Configs carry a (possibly placeholder) database section even when nothing reads it
+    uses_database = any(webhooks.get(feature, {}).get('enabled', False) for feature in ('killboard', 'guildwealth', 'killfeed'))
+    database = bot_config.get('database') if uses_database else None
+    if database:
+        keys.append((
+            "database", database.get('database_address'), str(database.get('database_port')), database.get('database_name')
+        ))
+    return keys
+
+
+def shard_configs(bot_configs, workers):
+    """Split (bot_name, bot_config) pairs into at most `workers` shards of roughly equal size.
+
+    Bots sharing a game server or a database, directly or through other bots, are grouped with
+    a union-find over those resources and always land in the same shard.
+    """
+    parents = {}
+
+    def find(key):
+        parents.setdefault(key, key)
+        while parents[key] != key:
+            parents[key] = parents[parents[key]]
+            key = parents[key]
+        return key
+
+    for _, bot_config in bot_configs:
+        first, *rest = shard_keys(bot_config)
+        for key in rest:
+            parents[find(key)] = find(first)
+
+    groups = {}
+    for bot_name, bot_config in bot_configs:
+        groups.setdefault(find(shard_keys(bot_config)[0]), []).append(bot_name)
+    shards = [[] for _ in range(max(1, min(workers, len(groups))))]
+    # Largest groups first, each onto the emptiest shard
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return [shard for shard in shards if shard]
+
+
+# ---------------- Worker Process ----------------
+async def _heartbeat(worker_id, heartbeats, interval):
+    watchdog = get_watchdog()
+    while True:
+        heartbeats.put({
+            "worker": worker_id,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "bots": dict(bot_states),
+            "jobs": len(get_scheduler().jobs),
+            "failing_jobs": sorted(name for name, _, _, failures, _, _ in get_scheduler().status() if failures),
+            "max_loop_lag": round(watchdog.max_lag, 3),
+            "slow_callbacks": sum(watchdog.slow_callbacks.values()),
+        })
+        await asyncio.sleep(interval)
+
+
+async def _worker(worker_id, bot_configs, stagger_delay, heartbeats, heartbeat_interval):
+    heartbeat = asyncio.ensure_future(_heartbeat(worker_id, heartbeats, heartbeat_interval))
+    try:
+        await run_bots(bot_configs, stagger_delay, metrics_port_offset=worker_id)
+    finally:
+        heartbeat.cancel()
+
+
+def worker_main(worker_id, bots_directory, bot_files, stagger_delay, heartbeats, heartbeat_interval):
+    """Entry point of a worker process: run one shard of bots and report a heartbeat."""
+    bot_configs = load_bot_configs(bots_directory, bot_files)
+    configure_logging(bot_configs)
+    BOT_NAME.set(f"worker-{worker_id}")
+    # The supervisor stops workers with SIGTERM; exit through KeyboardInterrupt so bots close cleanly
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(_worker(worker_id, bot_configs, stagger_delay, heartbeats, heartbeat_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------------- Supervisor ----------------
+class WorkerHandle:
+    def __init__(self, worker_id, bot_files):
+        self.worker_id = worker_id
+        self.bot_files = bot_files
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.failures = 0
+        self.restart_at = None
+        self.heartbeat = None
+
+
+class Supervisor:
+    """Starts one process per shard, restarts any that exit or stop sending heartbeats.
+
+    Restarts back off exponentially (min_backoff * 2^failures, capped at max_backoff); a worker
+    that stays up for `stable_after` seconds has its failure count reset.
+    """
+
+    def __init__(self, bots_directory, shards, stagger_delay=5, heartbeat_interval=10, heartbeat_timeout=60,
+                 min_backoff=5, max_backoff=300, stable_after=600, status_file=os.path.join('data', 'launcher_status.json')):
+        self.bots_directory = bots_directory
+        self.stagger_delay = stagger_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.status_file = status_file
+        # spawn, not fork: the parent has a logging thread that must not be copied mid-write
+        self.context = multiprocessing.get_context('spawn')
+        self.heartbeats = self.context.Queue()
+        self.workers = [WorkerHandle(worker_id, bot_files) for worker_id, bot_files in enumerate(shards)]
+        self.stopping = False
+
+    def _start(self, worker):
+        worker.process = self.context.Process(
+            target=worker_main, name=f"bot-worker-{worker.worker_id}",
+            args=(worker.worker_id, self.bots_directory, worker.bot_files, self.stagger_delay, self.heartbeats, self.heartbeat_interval),
+            daemon=False
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.heartbeat = None
+        worker.restart_at = None
+        logging.info(f"Started worker {worker.worker_id} (pid {worker.process.pid}): {', '.join(worker.bot_files)}")
+
+    def _schedule_restart(self, worker, reason):
+        uptime = time.monotonic() - worker.started_at
+        worker.failures = 0 if uptime >= self.stable_after else worker.failures + 1
+        delay = min(self.min_backoff * 2 ** worker.failures, self.max_backoff)
+        worker.restart_at = time.monotonic() + delay
+        worker.restarts += 1
+        logging.error(f"Worker {worker.worker_id} {reason} after {uptime:.0f}s; restarting in {delay:.0f}s")
+
+    def _drain_heartbeats(self):
+        while True:
+            try:
+                heartbeat = self.heartbeats.get_nowait()
+            except queue.Empty:
+                return
+            worker = self.workers[heartbeat["worker"]]
+            if worker.process is not None and heartbeat["pid"] == worker.process.pid:
+                heartbeat["received"] = time.monotonic()
+                worker.heartbeat = heartbeat
+
+    def _check(self, worker):
+        now = time.monotonic()
+        if worker.restart_at is not None:
+            if now >= worker.restart_at:
+                self._start(worker)
+            return
+        if not worker.process.is_alive():
+            self._schedule_restart(worker, f"exited with code {worker.process.exitcode}")
+            return
+        last_seen = worker.heartbeat["received"] if worker.heartbeat else worker.started_at
+        # Logins are staggered, so give a fresh worker time for all of its bots to start
+        grace = self.heartbeat_timeout + self.stagger_delay * len(worker.bot_files)
+        if now - last_seen > (self.heartbeat_timeout if worker.heartbeat else grace):
+            worker.process.kill()
+            worker.process.join(5)
+            self._schedule_restart(worker, f"sent no heartbeat for {now - last_seen:.0f}s and was killed")
+
+    def status(self):
+        now = time.monotonic()
+        return [
+            {
+                "worker": worker.worker_id,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": bool(worker.process and worker.process.is_alive()),
+                "configs": worker.bot_files,
+                "restarts": worker.restarts,
+                "restart_in": round(worker.restart_at - now, 1) if worker.restart_at else None,
+                "heartbeat_age": round(now - worker.heartbeat["received"], 1) if worker.heartbeat else None,
+                "heartbeat": {key: value for key, value in (worker.heartbeat or {}).items() if key != "received"},
+            }
+            for worker in self.workers
+        ]
+
+    def _write_status(self):
+        directory = os.path.dirname(self.status_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.status_file + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({"updated": time.time(), "workers": self.status()}, f, indent=2)
+        os.replace(temp_path, self.status_file)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for worker in self.workers:
+            self._start(worker)
+        last_status = 0
+        while not self.stopping:
+            time.sleep(1)
+            self._drain_heartbeats()
+            for worker in self.workers:
+                self._check(worker)
+            if time.monotonic() - last_status >= self.heartbeat_interval:
+                self._write_status()
+                last_status = time.monotonic()
+        self.shutdown()
+
+    def shutdown(self, timeout=15):
+        logging.info("Stopping workers...")
+        running = [worker.process for worker in self.workers if worker.process and worker.process.is_alive()]
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in running:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self._write_status()
+
+
+# ---------------- Entrypoint ----------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run every bot config across supervised worker processes.")
+    parser.add_argument('--bots-dir', default='Bots', help="Directory holding the bot configs.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes (default: one per CPU).")
+    parser.add_argument('--stagger', type=float, default=5, help="Seconds between bot logins within a worker.")
+    parser.add_argument('--heartbeat-interval', type=float, default=10)
+    parser.add_argument('--heartbeat-timeout', type=float, default=60, help="Restart a worker after this long without a heartbeat.")
+    parser.add_argument('--max-backoff', type=float, default=300, help="Longest wait before restarting a crashing worker.")
+    args = parser.parse_args()
+
+    setup_logging()
+    BOT_NAME.set("launcher")
+    bot_configs = load_bot_configs(args.bots_dir)
+    configure_logging(bot_configs)
+    file_names = {bot_name: f"{bot_name}.json" for bot_name, _ in bot_configs}
+    shards = [[file_names[bot_name] for bot_name in shard] for shard in shard_configs(bot_configs, args.workers)]
+    logging.info(f"Running {len(bot_configs)} bots in {len(shards)} worker processes")
+
+    Supervisor(
+        args.bots_dir, shards, args.stagger, args.heartbeat_interval, args.heartbeat_timeout,
+        max_backoff=args.max_backoff
+    ).run()
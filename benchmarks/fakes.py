@@ -0,0 +1,253 @@
+"""Offline stand-ins for the game server, Discord and the Life is Feudal database."""
+import asyncio
+import random
+import sqlite3
+import struct
+import time
+from contextlib import asynccontextmanager
+
+
+# ---------------- Fake A2S Server ----------------
+class FakeA2SServer(asyncio.DatagramProtocol):
+    """Answers A2S_INFO like a Source server that requires a challenge token."""
+
+    def __init__(self, name, player_count, max_players=64, challenge=0x1234ABCD):
+        self.name = name
+        self.player_count = player_count
+        self.max_players = max_players
+        self.challenge = struct.pack("<I", challenge)
+        self.packets = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.packets += 1
+        if data[-4:] != self.challenge:
+            self.transport.sendto(b"\xFF\xFF\xFF\xFFA" + self.challenge, addr)
+            return
+        self.transport.sendto(
+            b"\xFF\xFF\xFF\xFFI\x11"
+            + self.name.encode() + b"\0" + b"Map\0" + b"lif\0" + b"Life is Feudal\0"
+            + struct.pack("<H", 0)
+            + bytes([self.player_count, self.max_players, 0])
+            + b"dw\0\0" + b"1.0\0" + b"\0",
+            addr
+        )
+
+    @property
+    def address(self):
+        return self.transport.get_extra_info('sockname')[:2]
+
+
+async def start_a2s_servers(count):
+    loop = asyncio.get_running_loop()
+    servers = []
+    for index in range(count):
+        _, server = await loop.create_datagram_endpoint(
+            lambda index=index: FakeA2SServer(f"Server {index}", index % 65), local_addr=('127.0.0.1', 0)
+        )
+        servers.append(server)
+    return servers
+
+
+# ---------------- Fake Discord ----------------
+class DiscordRecorder:
+    """Counts simulated Discord REST calls and the latency each one took."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.next_id = 1000
+
+    async def call(self, kind):
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append((kind, time.perf_counter() - started))
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+
+class FakeGuild:
+    def __init__(self, me):
+        self.me = me
+
+
+class FakeMessage:
+    def __init__(self, channel, message_id, author, embed=None):
+        self.channel = channel
+        self.id = message_id
+        self.author = author
+        self.embed = embed
+
+    async def edit(self, embed=None, **kwargs):
+        await self.channel.recorder.call("edit")
+        self.embed = embed
+        return self
+
+    async def delete(self):
+        await self.channel.recorder.call("delete")
+        self.channel.messages.pop(self.id, None)
+
+
+class FakeChannel:
+    def __init__(self, channel_id, recorder, me="bot"):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.recorder = recorder
+        self.guild = FakeGuild(me)
+        self.messages = {}
+
+    async def send(self, content=None, embed=None, **kwargs):
+        await self.recorder.call("send")
+        message = FakeMessage(self, self.recorder.new_id(), self.guild.me, embed)
+        self.messages[message.id] = message
+        return message
+
+    def get_partial_message(self, message_id):
+        return self.messages.get(message_id) or FakeMessage(self, message_id, self.guild.me)
+
+    async def history(self, limit=100):
+        await self.recorder.call("history")
+        for message in list(self.messages.values())[-limit:]:
+            yield message
+
+
+class FakeClient:
+    def __init__(self, channels):
+        self.channels = {channel.id: channel for channel in channels}
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+
+# ---------------- Fake MySQL ----------------
+SCHEMA = """
+CREATE TABLE guilds (ID INTEGER PRIMARY KEY, Name TEXT);
+CREATE TABLE `character` (
+    ID INTEGER PRIMARY KEY, AccountID INTEGER, Name TEXT, Lastname TEXT, GuildID INTEGER,
+    RootContainerID INTEGER, EquipmentContainerID INTEGER
+);
+CREATE INDEX character_guild ON `character` (GuildID);
+CREATE TABLE chars_deathlog (ID INTEGER PRIMARY KEY, CharID INTEGER, KillerID INTEGER, Time INTEGER);
+CREATE TABLE objects_types (ID INTEGER PRIMARY KEY, BasePrice INTEGER);
+CREATE TABLE items (ID INTEGER PRIMARY KEY, ContainerID INTEGER, ObjectTypeID INTEGER);
+CREATE INDEX items_container ON items (ContainerID);
+CREATE TABLE outposts (ID INTEGER PRIMARY KEY, OwnerGuildID INTEGER);
+CREATE TABLE unmovable_objects (ID INTEGER PRIMARY KEY, RootContainerID INTEGER);
+CREATE TABLE unmovable_objects_claims (ID INTEGER PRIMARY KEY, UnmovableObjectID INTEGER, ClaimID INTEGER);
+CREATE TABLE guild_lands (ID INTEGER PRIMARY KEY, GuildID INTEGER);
+"""
+
+
+class FakeDatabase:
+    """An in-memory SQLite copy of the LiF tables the bots read, filled with synthetic rows."""
+
+    def __init__(self, characters=5000, deaths=200000, guilds=200, items_per_character=60, seed=1):
+        self.random = random.Random(seed)
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self.characters = characters
+        self.queries = 0
+        self._populate(guilds, items_per_character)
+        self.add_deaths(deaths)
+
+    def _populate(self, guilds, items_per_character):
+        rng = self.random
+        self.connection.executemany("INSERT INTO guilds VALUES (?, ?)", ((i, f"Guild {i}") for i in range(1, guilds + 1)))
+        self.connection.executemany(
+            "INSERT INTO `character` VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (i, i // 2, f"Name{i}", f"Last{i}", rng.randint(1, guilds) if rng.random() > 0.1 else None, i * 2, i * 2 + 1)
+                for i in range(1, self.characters + 1)
+            )
+        )
+        self.connection.executemany("INSERT INTO objects_types VALUES (?, ?)", ((i, rng.randint(1, 500)) for i in range(1, 1001)))
+        self.connection.executemany(
+            "INSERT INTO items (ContainerID, ObjectTypeID) VALUES (?, ?)",
+            ((rng.randint(2, self.characters * 2 + 1), rng.randint(1, 1000)) for _ in range(self.characters * items_per_character))
+        )
+        self.connection.executemany("INSERT INTO outposts (OwnerGuildID) VALUES (?)", ((rng.randint(1, guilds),) for _ in range(guilds // 2)))
+        claims = guilds * 3
+        self.connection.executemany("INSERT INTO guild_lands VALUES (?, ?)", ((i, rng.randint(1, guilds)) for i in range(1, claims + 1)))
+        self.connection.executemany(
+            "INSERT INTO unmovable_objects VALUES (?, ?)", ((i, 10_000_000 + i) for i in range(1, claims * 10 + 1))
+        )
+        self.connection.executemany(
+            "INSERT INTO unmovable_objects_claims (UnmovableObjectID, ClaimID) VALUES (?, ?)",
+            ((i, rng.randint(1, claims)) for i in range(1, claims * 10 + 1))
+        )
+        self.connection.executemany(
+            "INSERT INTO items (ContainerID, ObjectTypeID) VALUES (?, ?)",
+            ((10_000_000 + rng.randint(1, claims * 10), rng.randint(1, 1000)) for _ in range(claims * 50))
+        )
+
+    def add_deaths(self, count):
+        rng = self.random
+        self.connection.executemany(
+            "INSERT INTO chars_deathlog (CharID, KillerID, Time) VALUES (?, ?, ?)",
+            (
+                (rng.randint(1, self.characters), rng.randint(1, self.characters) if rng.random() > 0.2 else 4294967294, 0)
+                for _ in range(count)
+            )
+        )
+
+    def execute(self, query, params=()):
+        self.queries += 1
+        return self.connection.execute(query.replace('%s', '?'), params or ())
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=()):
+        self.rows = [dict(row) for row in self.database.execute(query, params).fetchall()]
+        await asyncio.sleep(0)
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    async def ping(self, reconnect=True):
+        pass
+
+    def cursor(self, *args):
+        return FakeCursor(self.database)
+
+
+class FakePool:
+    """Implements the slice of aiomysql's Pool interface that dbpool uses."""
+
+    def __init__(self, database):
+        self.database = database
+        self.closed = False
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self.database)
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
@@ -0,0 +1,258 @@
+"""Offline benchmarks for the bot's hot paths; no network, Discord or MySQL needed.
+
+    python -m benchmarks.run [--scale 1.0] [--output bench_output.txt]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+import discord
+
+from benchmarks.fakes import DiscordRecorder, FakeChannel, FakeClient, FakeDatabase, FakePool, start_a2s_servers
+from bot import MessageCache, MessageManager
+from ChatBot import ChatBot
+from dbpool import install_pool
+from fuzzymatch import available as fuzzy_available
+from killboard import cached_top
+from killfeed import KillFeed
+from lifstats import get_guild_wealth_index
+from messageregistry import MessageRegistry
+from outbound import DiscordWriteScheduler
+from resultcache import get_result_cache
+from serverquery import get_a2s_client
+
+DATABASE_CONFIG = {
+    "database_address": "benchmark",
+    "database_port": "3306",
+    "database_user": "bench",
+    "database_password": "",
+    "database_name": "lif"
+}
+
+
+# ---------------- Reporting ----------------
+def report(name, samples, unit_count=1, extra=""):
+    """Format one result line: runs, throughput and latency percentiles of the samples (seconds)."""
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    total = sum(samples)
+    throughput = (len(samples) * unit_count) / total if total else float('inf')
+    return (
+        f"{name:<34} runs={len(samples):<6} {throughput:>12.1f}/s  "
+        f"p50={percentile(0.50):8.3f}ms  p95={percentile(0.95):8.3f}ms  p99={percentile(0.99):8.3f}ms  {extra}"
+    )
+
+
+# ---------------- Chatbot ----------------
+def message_corpus(responses, count, rng):
+    """Messages built from the response patterns (so they match) mixed with unrelated chatter."""
+    phrases = []
+    for item in responses:
+        for pattern in item.get("regex", []):
+            phrases.append(re.sub(r'\\(.)', r'\1', pattern.replace('.*', ' ')))
+    filler = "anyone want to trade iron for some wood later tonight lol brb".split()
+    corpus = []
+    for _ in range(count):
+        if rng.random() < 0.4 and phrases:
+            corpus.append(f"hey {rng.choice(phrases)} ?")
+        else:
+            corpus.append(" ".join(rng.choice(filler) for _ in range(rng.randint(3, 15))))
+    return corpus
+
+
+def bench_chatbot(scale, rng):
+    chat_bot = ChatBot(None)
+    corpus = message_corpus(chat_bot.responses, int(5000 * scale), rng)
+    samples = []
+    matched = 0
+    for text in corpus:
+        started = time.perf_counter()
+        response = chat_bot.get_response(text)
+        samples.append(time.perf_counter() - started)
+        matched += response is not None
+    lines = [report("ChatBot.get_response", samples, extra=f"matched={matched}/{len(corpus)} patterns={len(chat_bot.response_index.entries)}")]
+    if fuzzy_available():
+        chat_bot = ChatBot(None, fuzzy_threshold=0.6)
+        samples = []
+        matched = 0
+        for text in corpus:
+            started = time.perf_counter()
+            response = chat_bot.get_response(text)
+            samples.append(time.perf_counter() - started)
+            matched += response is not None
+        lines.append(report("ChatBot.get_response (fuzzy)", samples, extra=f"matched={matched}/{len(corpus)}"))
+    return lines
+
+
+# ---------------- Database ----------------
+async def bench_database(scale):
+    started = time.perf_counter()
+    database = FakeDatabase(
+        characters=int(5000 * scale), deaths=int(200000 * scale), guilds=max(10, int(200 * scale))
+    )
+    setup = time.perf_counter() - started
+    install_pool(DATABASE_CONFIG, FakePool(database))
+    lines = []
+
+    # The killboard dashboard's settings for the default 120s update_interval
+    killboard_top = lambda: cached_top(DATABASE_CONFIG, None, 10, ttl=96)
+    started = time.perf_counter()
+    await killboard_top()
+    lines.append(report("killboard top (rebuild)", [time.perf_counter() - started], extra=f"deaths={int(200000 * scale)}"))
+
+    samples = []
+    for _ in range(20):
+        database.add_deaths(50)
+        get_result_cache().invalidate(DATABASE_CONFIG)
+        started = time.perf_counter()
+        await killboard_top()
+        samples.append(time.perf_counter() - started)
+    lines.append(report("killboard top (incremental)", samples, extra="50 new deaths/tick"))
+
+    samples = []
+    queries_before = database.queries
+    for _ in range(20):
+        database.add_deaths(50)
+        get_result_cache().invalidate(DATABASE_CONFIG)
+        started = time.perf_counter()
+        await asyncio.gather(*(killboard_top() for _ in range(10)))
+        samples.append(time.perf_counter() - started)
+    lines.append(report("killboard top (10 bots/tick)", samples, extra=f"queries/tick={(database.queries - queries_before) / 20:.1f}"))
+
+    index = get_guild_wealth_index(DATABASE_CONFIG)
+    samples = []
+    for _ in range(5):
+        started = time.perf_counter()
+        await index.refresh(DATABASE_CONFIG, "bench")
+        samples.append(time.perf_counter() - started)
+    lines.append(report("guild wealth snapshot refresh", samples, extra=f"guilds={len(index.snapshot.guilds)}"))
+
+    samples = []
+    queries_before = database.queries
+    for _ in range(1000):
+        started = time.perf_counter()
+        (await index.get(DATABASE_CONFIG, "bench")).top(13)
+        samples.append(time.perf_counter() - started)
+    lines.append(report("guild wealth snapshot get (top 13)", samples, extra=f"queries={database.queries - queries_before}"))
+
+    feed = KillFeed(DATABASE_CONFIG)
+    feed.subscribers.add(lambda kills: None)
+    await feed.poll()
+    samples = []
+    queries_before = database.queries
+    for _ in range(20):
+        database.add_deaths(100)
+        started = time.perf_counter()
+        await feed.poll()
+        samples.append(time.perf_counter() - started)
+    lines.append(report("kill feed poll", samples, extra=f"100 deaths/poll queries/poll={(database.queries - queries_before) / 20:.1f}"))
+    lines.append(f"{'(synthetic database build)':<34} {setup:.2f}s")
+    return lines
+
+
+# ---------------- A2S ----------------
+async def bench_a2s(scale):
+    servers = await start_a2s_servers(max(1, int(50 * scale)))
+    addresses = [server.address for server in servers]
+    client = get_a2s_client()
+    samples = []
+    for _ in range(20):
+        started = time.perf_counter()
+        results = await client.info_many(addresses, timeout=2)
+        samples.append(time.perf_counter() - started)
+    failures = sum(isinstance(result, Exception) for result in results.values())
+    packets = sum(server.packets for server in servers)
+    for server in servers:
+        server.transport.close()
+    return [report(
+        "A2S info_many fan-out", samples, unit_count=len(addresses),
+        extra=f"servers={len(addresses)} failures={failures} packets={packets}"
+    )]
+
+
+# ---------------- Message Manager ----------------
+def dashboard_embeds(cycle):
+    """The five dashboards as they change over refresh cycles: info every 2nd, killboard every 3rd."""
+    return {
+        "status": discord.Embed(title="Server Status", description="Server is Online!"),
+        "info": discord.Embed(title="Server Information", description=f"Players {cycle // 2}/64"),
+        "rules": discord.Embed(title="Server Rules", description="1. Be nice"),
+        "killboard": discord.Embed(title="Killboard", description=f"Top killer has {cycle // 3} kills"),
+        "guildwealth": discord.Embed(title="Guild Wealth", description="Guild 1 | 12345"),
+    }
+
+
+async def bench_message_manager(latency):
+    recorder = DiscordRecorder(latency)
+    channels = [FakeChannel(channel_id, recorder) for channel_id in range(1, 6)]
+    with tempfile.TemporaryDirectory() as directory:
+        registry = MessageRegistry(os.path.join(directory, "messages.sqlite3"))
+        outbound = DiscordWriteScheduler()
+        manager = MessageManager(outbound=outbound, bot_name="bench", registry=registry, message_cache=MessageCache())
+
+        cycles = 30
+        per_cycle = []
+        for cycle in range(cycles):
+            before = len(recorder.calls)
+            for channel, (cache_key, embed) in zip(channels, dashboard_embeds(cycle).items()):
+                await manager.get_or_create_message(channel, embed, cache_key)
+            while outbound.queue_depth:
+                await asyncio.sleep(latency or 0.001)
+            await asyncio.sleep(latency * 2)
+            per_cycle.append(len(recorder.calls) - before)
+        await outbound.close()
+
+        # A warm restart: re-attach from the registry and clean up the dashboard channels
+        before = len(recorder.calls)
+        restarted = MessageManager(bot_name="bench", registry=registry, message_cache=MessageCache())
+        restored = restarted.restore_messages(FakeClient(channels))
+        for channel in channels:
+            await restarted.delete_old_messages(channel, ignore_ids=restored)
+        restart_calls = len(recorder.calls) - before
+
+    latencies = [seconds for _, seconds in recorder.calls]
+    steady = per_cycle[1:]
+    return [
+        report("Discord API calls", latencies, extra=f"simulated latency={latency * 1000:.0f}ms"),
+        f"{'MessageManager calls/refresh cycle':<34} first={per_cycle[0]} steady avg={statistics.mean(steady):.2f} "
+        f"max={max(steady)} (5 dashboards, {cycles} cycles)",
+        f"{'MessageManager warm restart':<34} calls={restart_calls} restored={len(restored)}",
+    ]
+
+
+# ---------------- Entrypoint ----------------
+async def main(args):
+    rng = random.Random(args.seed)
+    lines = []
+    lines += bench_chatbot(args.scale, rng)
+    lines += await bench_database(args.scale)
+    lines += await bench_a2s(args.scale)
+    lines += await bench_message_manager(args.discord_latency)
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiplier for corpus, table and server counts.")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--discord-latency', type=float, default=0.02, help="Simulated seconds per Discord API call.")
+    parser.add_argument('--output', help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    # Per-message info and warning logs would dominate the timings
+    logging.disable(logging.WARNING)
+    lines = asyncio.run(main(args))
+    text = "\n".join(lines)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(vars(args)) + "\n" + text + "\n")
@@ -1,189 +1,346 @@
+import argparse
 import asyncio
 import discord
+import hashlib
 import json
 import os
-import a2s
-import aiomysql
+import time
+from collections import OrderedDict
 from discord.ext import commands
 from ChatBot import ChatBot
-from lifstats import fetch_guild_wealth_data, periodic_guildwealth_update
+from dbpool import database_label, release_pool, retain_pool
+from killboard import cached_top, get_killboard
+from killfeed import KillFeedChannel, get_kill_feed
+from lifstats import get_guild_wealth_index, guild_lookup_embed, guild_page_embed, update_guildwealth
+from logsetup import BOT_NAME, setup_logging
+from loopwatch import get_watchdog
+from messageregistry import get_message_registry
+from metrics import start_metrics_server
+from outbound import PRIORITY_CLEANUP, PRIORITY_DASHBOARD, DiscordWriteScheduler
+from population import get_population_history
+from scheduler import get_scheduler
+from serverquery import get_a2s_client, get_poller
 import logging
 
-# ---------------- Logging Setup ----------------
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# ---------------- Message Cache ----------------
+class MessageCache:
+    """Lightweight dashboard message handles keyed by (bot, channel, key), LRU-bounded per channel."""
+
+    def __init__(self, max_per_channel=10):
+        self.max_per_channel = max_per_channel
+        # (bot_name, channel_id) -> OrderedDict of cache_key -> PartialMessage, least recently used first
+        self.channels = {}
+
+    def get(self, bot_name, channel_id, cache_key):
+        entries = self.channels.get((bot_name, channel_id))
+        if entries is None or cache_key not in entries:
+            return None
+        entries.move_to_end(cache_key)
+        return entries[cache_key]
+
+    def put(self, bot_name, channel_id, cache_key, handle):
+        entries = self.channels.setdefault((bot_name, channel_id), OrderedDict())
+        entries[cache_key] = handle
+        entries.move_to_end(cache_key)
+
+    def pop(self, bot_name, channel_id, cache_key):
+        entries = self.channels.get((bot_name, channel_id))
+        if entries is None:
+            return None
+        handle = entries.pop(cache_key, None)
+        if not entries:
+            del self.channels[(bot_name, channel_id)]
+        return handle
+
+    def evict(self, bot_name, channel_id):
+        """Drop least recently used entries until the channel is within bounds; returns the dropped pairs."""
+        entries = self.channels.get((bot_name, channel_id))
+        evicted = []
+        while entries is not None and len(entries) > self.max_per_channel:
+            evicted.append(entries.popitem(last=False))
+        return evicted
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.channels.values())
 
 
 # ---------------- Message Manager ----------------
 class MessageManager:
-    def __init__(self):
-        self.message_cache = {}
+    def __init__(self, max_edit_age=None, outbound=None, bot_name=None, registry=None, message_cache=None):
+        self.message_cache = message_cache if message_cache is not None else MessageCache()
+        # cache_key -> channel_id the dashboard currently lives in
+        self.dashboard_channels = {}
+        # MessageRegistry that persists cache_key -> message across restarts; None keeps nothing
+        self.bot_name = bot_name
+        self.registry = registry
+        # cache_key -> (fingerprint of the embed last sent, when it was sent)
+        self.embed_fingerprints = {}
+        # cache_key -> the embed last written, re-sent if its message turns out to be deleted
+        self.dashboard_embeds = {}
+        # Re-send an unchanged embed after this many seconds anyway; None never forces a refresh
+        self.max_edit_age = max_edit_age
+        # DiscordWriteScheduler all writes go through; None calls discord.py directly
+        self.outbound = outbound
+
+    def _write(self, channel, factory, priority=PRIORITY_DASHBOARD, coalesce_key=None, kind="send"):
+        if self.outbound is None:
+            return asyncio.ensure_future(factory())
+        return self.outbound.submit(factory, channel.id, priority, coalesce_key, kind)
+
+    def restore_messages(self, client):
+        """Re-attach to dashboard messages recorded before a restart; returns their message IDs."""
+        if self.registry is None:
+            return set()
+        restored = set()
+        for cache_key, (channel_id, message_id) in self.registry.load(self.bot_name).items():
+            channel = client.get_channel(channel_id)
+            if channel is None:
+                self.registry.remove(self.bot_name, cache_key)
+                continue
+            self._remember(cache_key, channel, message_id)
+            restored.add(message_id)
+        return restored
+
+    def _remember(self, cache_key, channel, message_id):
+        # Only a PartialMessage (channel + ID) is kept, never the full message with its embeds and author
+        handle = channel.get_partial_message(message_id)
+        self.message_cache.put(self.bot_name, channel.id, cache_key, handle)
+        self.dashboard_channels[cache_key] = channel.id
+        return handle
+
+    def _forget(self, cache_key):
+        channel_id = self.dashboard_channels.pop(cache_key, None)
+        if channel_id is not None:
+            self.message_cache.pop(self.bot_name, channel_id, cache_key)
+        self.embed_fingerprints.pop(cache_key, None)
+        self.dashboard_embeds.pop(cache_key, None)
+        if self.registry is not None:
+            self.registry.remove(self.bot_name, cache_key)
 
     async def delete_old_messages(self, channel, ignore_ids=[]):
+        deletes = []
         async for message in channel.history(limit=100):
             if message.author == channel.guild.me:
                 if message.id not in ignore_ids:
-                    try:
-                        await message.delete()
-                    except discord.NotFound:
-                        pass
-                    except Exception as e:
-                        print(f"Failed to delete message {message.id}: {e}")
+                    deletes.append((message.id, self._write(channel, message.delete, PRIORITY_CLEANUP, kind="delete")))
 
-    async def send_embedded_message(self, channel, embed):
-        message = await channel.send(embed=embed)
-        return message
-
-    async def get_or_create_message(self, channel, embed, cache_key):
-        if cache_key in self.message_cache:
+        for message_id, delete in deletes:
             try:
-                message = self.message_cache[cache_key]
-                await message.edit(embed=embed)
-                return message
+                await delete
             except discord.NotFound:
-                del self.message_cache[cache_key]
+                pass
+            except Exception as e:
+                print(f"Failed to delete message {message_id}: {e}")
 
-        message = await self.send_embedded_message(channel, embed)
-        self.message_cache[cache_key] = message
-        await self.limit_messages(channel)
+    async def send_embedded_message(self, channel, embed):
+        message = await self._write(channel, lambda: channel.send(embed=embed))
         return message
 
-    async def limit_messages(self, channel):
-        if len(self.message_cache) > 10:
-            oldest_key = next(iter(self.message_cache))
-            oldest_message = self.message_cache[oldest_key]
-            await oldest_message.delete()
-            del self.message_cache[oldest_key]
+    @staticmethod
+    def embed_fingerprint(embed):
+        return hashlib.sha1(json.dumps(embed.to_dict(), sort_keys=True, default=str).encode()).hexdigest()
 
+    def is_unchanged(self, cache_key, fingerprint):
+        previous = self.embed_fingerprints.get(cache_key)
+        if previous is None or previous[0] != fingerprint:
+            return False
+        return self.max_edit_age is None or time.monotonic() - previous[1] < self.max_edit_age
 
-# ---------------- Server Info Helper ----------------
-async def get_server_info(address):
-    try:
-        ip = address.get('server_ip')
-        port = int(address.get('query_port')) if address.get('query_port') else None
-        loop = asyncio.get_running_loop()
-        info = await loop.run_in_executor(None, lambda: a2s.info((ip, port), timeout=5))
-        return info.player_count, info.max_players, True
-    except asyncio.TimeoutError:
-        return 0, 0, False
-    except Exception as e:
-        logging.error(f"Error fetching server info: {e}")
-        return 0, 0, False
+    def _edit_finished(self, cache_key, message, edit):
+        if edit.cancelled() or edit.exception() is None:
+            return
+        # Forget the fingerprint so the next refresh retries, and re-send if the message is gone
+        self.embed_fingerprints.pop(cache_key, None)
+        if isinstance(edit.exception(), discord.NotFound):
+            if self.message_cache.get(self.bot_name, message.channel.id, cache_key) is message:
+                # The renderers only write on change, so waiting for the next refresh could take forever
+                embed = self.dashboard_embeds.get(cache_key)
+                self._forget(cache_key)
+                if embed is not None:
+                    asyncio.ensure_future(self._resend(message.channel, embed, cache_key))
+        else:
+            logging.error(f"Failed to edit message {message.id}: {edit.exception()}")
+
+    async def _resend(self, channel, embed, cache_key):
+        try:
+            await self.get_or_create_message(channel, embed, cache_key)
+        except Exception as e:
+            logging.error(f"Failed to re-send deleted {cache_key} message: {e}")
 
+    async def get_or_create_message(self, channel, embed, cache_key, force=False):
+        fingerprint = self.embed_fingerprint(embed)
+        if self.dashboard_channels.get(cache_key, channel.id) != channel.id:
+            # The dashboard was moved to another channel; the old message is left for cleanup
+            self._forget(cache_key)
 
-# ---------------- Fetch Kill Data ----------------
-async def fetch_kills_data(bot_config, bot_name):
-    results = []
-    try:
-        async with aiomysql.connect(
-            host=bot_config['database']['database_address'],
-            port=int(bot_config['database']['database_port']),
-            user=bot_config['database']['database_user'],
-            password=bot_config['database']['database_password'],
-            db=bot_config['database']['database_name'],
-            autocommit=True
-        ) as connection:
-            async with connection.cursor(aiomysql.DictCursor) as cursor:
-                query = """
-                    SELECT 
-                        c.Name, 
-                        c.Lastname, 
-                        COUNT(CASE 
-                                  WHEN d.KillerID = c.ID AND c.GuildID <> victim.GuildID 
-                                  THEN 1 
-                             END) AS kills,
-                        COUNT(CASE 
-                                  WHEN d.CharID = c.ID THEN 1 
-                             END) AS deaths, 
-                        COUNT(CASE 
-                                  WHEN d.KillerID = c.ID AND c.GuildID = victim.GuildID 
-                                  THEN 1 
-                             END) AS team_kills,
-                        CASE 
-                            WHEN COUNT(CASE WHEN d.CharID = c.ID THEN 1 END) = 0 
-                            THEN COUNT(CASE WHEN d.KillerID = c.ID AND c.GuildID <> victim.GuildID THEN 1 END)
-                            ELSE ROUND(
-                                COUNT(CASE WHEN d.KillerID = c.ID AND c.GuildID <> victim.GuildID THEN 1 END) / 
-                                COUNT(CASE WHEN d.CharID = c.ID THEN 1 END), 2
-                            ) 
-                        END AS kd_ratio
-                    FROM 
-                        chars_deathlog d
-                    JOIN 
-                        `character` c ON d.KillerID = c.ID 
-                    JOIN 
-                        `character` victim ON d.CharID = victim.ID
-                    WHERE 
-                        d.KillerID <> 4294967294
-                    GROUP BY 
-                        c.ID, c.Name, c.Lastname
-                    ORDER BY 
-                        kills DESC
-                    LIMIT 10;
-                """
-                await cursor.execute(query)
-                results = await cursor.fetchall()
-
-        logging.info(f"{bot_name} | Kill data fetched successfully.")
-        return [
-            {
-                "name": record["Name"],
-                "lastname": record["Lastname"],
-                "kills": record["kills"],
-                "deaths": record["deaths"],
-                "team_kills": record["team_kills"],
-                "kd_ratio": record["kd_ratio"]
-            }
-            for record in results
-        ]
-    except aiomysql.Error as db_error:
-        logging.error(f"{bot_name} | Database error: {db_error}")
-        return []
-    except Exception as e:
-        logging.error(f"{bot_name} | Unexpected error: {e}")
-        return []
+        message = self.message_cache.get(self.bot_name, channel.id, cache_key)
+        if message is not None:
+            if not force and self.is_unchanged(cache_key, fingerprint):
+                return message
+            # Queued without waiting; a newer edit of the same message replaces this one if it is still pending
+            edit = self._write(channel, lambda: message.edit(embed=embed), coalesce_key=('edit', message.id), kind="edit")
+            edit.add_done_callback(lambda edit: self._edit_finished(cache_key, message, edit))
+            self.embed_fingerprints[cache_key] = (fingerprint, time.monotonic())
+            self.dashboard_embeds[cache_key] = embed
+            return message
+
+        sent = await self.send_embedded_message(channel, embed)
+        message = self._remember(cache_key, channel, sent.id)
+        self.embed_fingerprints[cache_key] = (fingerprint, time.monotonic())
+        self.dashboard_embeds[cache_key] = embed
+        if self.registry is not None:
+            self.registry.save(self.bot_name, cache_key, channel.id, sent.id)
+        await self.limit_messages(channel)
+        return message
+
+    async def limit_messages(self, channel):
+        # Bounded per channel, so one busy channel never evicts another channel's live dashboard
+        for oldest_key, oldest_message in self.message_cache.evict(self.bot_name, channel.id):
+            self._forget(oldest_key)
+            await self._write(channel, oldest_message.delete, PRIORITY_CLEANUP, kind="delete")
 
 
 # ---------------- Bot Setup ----------------
-class BotNameFilter(logging.Filter):
-    def __init__(self, bot_name):
-        super().__init__()
-        self.bot_name = bot_name
-
-    def filter(self, record):
-        record.bot_name = self.bot_name
-        return True
+def busiest_embed(population, bot_config, days=30):
+    """Embed answering "when is the server busiest" from the population history."""
+    embed = discord.Embed(title=f"When is {bot_config.get('server_name', 'the server')} busiest?", color=0x00FF00)
+    busiest = population.busiest(days)
+    if busiest is None:
+        embed.description = "Not enough player history yet, check back later."
+        return embed
+    hours, weekdays = busiest
+    embed.description = f"Average players over the last {days} days (bot time)."
+    embed.add_field(name="Busiest Hours", value="\n".join(f"{label}: {average:.1f}" for label, average in hours[:3]), inline=False)
+    embed.add_field(name="Busiest Days", value="\n".join(f"{label}: {average:.1f}" for label, average in weekdays[:3]), inline=False)
+    week = population.summary(7 * 86400)
+    if week is not None:
+        embed.add_field(name="Last 7 Days", value=f"Peak: {week[0]} | Average: {week[1]:.1f}", inline=False)
+    embed.set_thumbnail(url="https://i.ibb.co/VC2vTMw/botimage.png")
+    return embed
+
+
+def kd_embed(killboard, query, bot_name):
+    """Embed answering /kd <name> from the in-memory killboard index."""
+    embed = discord.Embed(title=f"{bot_name} K/D Lookup", color=discord.Color.purple())
+    if not query:
+        embed.description = "Usage: /kd <character name>"
+        return embed
+    if not killboard.loaded:
+        embed.description = "The killboard is still loading, try again in a minute."
+        return embed
+    matches = killboard.lookup(query)
+    if not matches:
+        embed.description = f"No character found starting with \"{query}\"."
+        return embed
+    for rank, stats in matches:
+        embed.add_field(
+            name=f"#{rank} {stats.name} {stats.lastname or ''}".strip(),
+            value=f"Kills: {stats.kills} | Deaths: {stats.deaths} | TK: {stats.team_kills} | K/D: {stats.kd_ratio:.2f}",
+            inline=False
+        )
+    embed.set_footer(text=f"Ranked by kills out of {killboard.ranked_count} characters")
+    return embed
+
+
+# Connection state of each bot in this process, reported in the launcher's heartbeats
+bot_states = {}
 
 
 async def setup_discord_bot(message_manager, bot_name, bot_token, bot_config):
+    # Tags every log line from this bot's tasks, including discord.py's own gateway logs
+    BOT_NAME.set(bot_name)
     logger = logging.getLogger(bot_name)
-    logger.setLevel(logging.INFO)
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter(f'%(asctime)s - {bot_name} - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.propagate = False
-
-    gateway_logger = logging.getLogger('discord.gateway')
-    gateway_logger.addFilter(BotNameFilter(bot_name))
+    bot_states[bot_name] = "starting"
 
     intents = discord.Intents.default()
     intents.messages = True
     intents.guilds = True
     intents.message_content = True
 
-    client = commands.Bot(command_prefix="!", intents=intents)
-    chat_bot = ChatBot(bot_config.get('active_response_file', 'responses.json'))
+    if bot_config.get('sharded', False):
+        # One gateway connection per shard, for bots in more guilds than one connection can hold
+        shard_count = bot_config.get('shard_count')
+        client = commands.AutoShardedBot(
+            command_prefix="!", intents=intents, shard_count=int(shard_count) if shard_count else None
+        )
+    else:
+        client = commands.Bot(command_prefix="!", intents=intents)
+    # Every Discord write from this bot is queued so chat replies go ahead of dashboard refreshes
+    outbound = DiscordWriteScheduler(bot_name, **bot_config.get('outbound', {}))
+    message_manager.outbound = outbound
+    fuzzy_config = bot_config.get('fuzzy_matching', {})
+    chat_bot = ChatBot(
+        bot_config.get('link_channel_id'),
+        bot_config.get('active_response_file'),
+        float(fuzzy_config.get('threshold', 0.6)) if fuzzy_config.get('enabled', False) else None
+    )
+    chat_bot.outbound = outbound
     webhooks = bot_config.get('webhooks', {})
 
     server_status_update_interval = int(webhooks.get('server_status', {}).get('update_interval', 120))
     server_info_update_interval = int(webhooks.get('server_information', {}).get('update_interval', 120))
     server_rules_update_interval = int(webhooks.get('server_rules', {}).get('update_interval', 120))
     killboard_update_interval = int(webhooks.get('killboard', {}).get('update_interval', 120))
-    guildwealth_update_interval = int(webhooks.get('guildwealth', {}).get('update_interval', 120))
+    # The guildwealth section has always used "interval"; "update_interval" is accepted to match the others
+    guildwealth_update_interval = int(webhooks.get('guildwealth', {}).get('interval', webhooks.get('guildwealth', {}).get('update_interval', 120)))
+
+    server_poller = get_poller(bot_config['server_ip'], bot_config['query_port'])
+    server_subscriptions = {}
+    kill_feed_subscriptions = []
+    scheduler = get_scheduler()
+    bot_jobs = []
+    # This bot's own jobs plus the shared ones it feeds from; all that /CBjobs shows its admins
+    visible_jobs = []
+    chat_bot.visible_jobs = visible_jobs
+
+    population_config = bot_config.get('population', {})
+    population = None
+    if population_config.get('enabled', True):
+        population = get_population_history(
+            bot_config['server_ip'], bot_config['query_port'],
+            population_config.get('directory', os.path.join('data', 'population'))
+        )
+
+        async def busiest_command(message):
+            await chat_bot.send_reply(message.channel, embed=busiest_embed(population, bot_config))
+
+        chat_bot.register_command('/busiest', busiest_command)
+
+    uses_database = any(webhooks.get(feature, {}).get('enabled', False) for feature in ('killboard', 'guildwealth', 'killfeed'))
+    database_config = bot_config.get('database') if uses_database else None
+    if database_config:
+        retain_pool(database_config)
+
+    if database_config and webhooks.get('killboard', {}).get('enabled', False):
+        # Answered from the killboard index the killboard job keeps refreshed; never queries MySQL
+        killboard_index = get_killboard(database_config, webhooks['killboard'].get('state_file'))
+
+        async def kd_command(message):
+            query = message.content.split(' ', 1)[1] if ' ' in message.content else ''
+            await chat_bot.send_reply(message.channel, embed=kd_embed(killboard_index, query.strip(), bot_name))
+
+        chat_bot.register_command('/kd', kd_command)
+
+    if database_config and webhooks.get('guildwealth', {}).get('enabled', False):
+        # Answered from the last guild wealth snapshot; never queries MySQL
+        wealth_index = get_guild_wealth_index(database_config)
+
+        async def guilds_command(message):
+            argument = message.content.split(' ', 1)[1].strip() if ' ' in message.content else ''
+            page = int(argument) if argument.isdigit() else 1
+            await chat_bot.send_reply(message.channel, embed=guild_page_embed(wealth_index.snapshot, page, bot_name))
+
+        async def guild_command(message):
+            query = message.content.split(' ', 1)[1].strip() if ' ' in message.content else ''
+            await chat_bot.send_reply(message.channel, embed=guild_lookup_embed(wealth_index.snapshot, query, bot_name))
+
+        chat_bot.register_command('/guilds', guilds_command)
+        chat_bot.register_command('/guild', guild_command)
 
     @client.event
     async def on_ready():
         logger.info("Bot logged in as %s", client.user)
+        bot_states[bot_name] = "ready"
 
         try:
             server_status_channel_id = webhooks.get('server_status', {}).get('channel_id')
@@ -201,39 +358,95 @@ async def setup_discord_bot(message_manager, bot_name, bot_token, bot_config):
             if not all([server_status_channel, server_info_channel, server_rules_channel, killboard_channel, guildwealth_channel]):
                 raise ValueError("One or more channels could not be found.")
 
-            await message_manager.delete_old_messages(server_status_channel)
-            await message_manager.delete_old_messages(server_info_channel)
-            await message_manager.delete_old_messages(server_rules_channel)
-            await message_manager.delete_old_messages(killboard_channel)
-            await message_manager.delete_old_messages(guildwealth_channel)
+            # Dashboards recorded before a restart are edited in place; only orphaned bot messages are deleted
+            restored_ids = message_manager.restore_messages(client)
+            for channel in {server_status_channel, server_info_channel, server_rules_channel, killboard_channel, guildwealth_channel}:
+                await message_manager.delete_old_messages(channel, ignore_ids=restored_ids)
+
+            # Presence, status and info all render from one shared A2S poller per server.
+            for callback in server_subscriptions:
+                server_poller.unsubscribe(callback)
+            server_subscriptions.clear()
 
             if webhooks.get('server_status', {}).get('enabled', False):
-                client.loop.create_task(periodic_server_status_update(client, server_status_channel, bot_config, message_manager, bot_name, server_status_update_interval))
+                server_subscriptions[server_status_renderer(server_status_channel, bot_config, message_manager, bot_name)] = server_status_update_interval
 
             if webhooks.get('server_information', {}).get('enabled', False):
-                client.loop.create_task(periodic_server_info_update(server_info_channel, bot_config, message_manager, bot_name, server_info_update_interval))
+                server_subscriptions[server_info_renderer(server_info_channel, bot_config, message_manager, bot_name)] = server_info_update_interval
+
+            # Everything else is a job on the shared scheduler; reconnects replace this bot's jobs
+            for job_name in bot_jobs:
+                scheduler.remove(job_name)
+            bot_jobs.clear()
+            shared_jobs = [server_poller.job_name]
+
+            def add_job(feature, func, interval, **options):
+                job_name = f"{bot_name}:{feature}"
+                scheduler.add(job_name, func, interval, **options)
+                bot_jobs.append(job_name)
 
             if webhooks.get('server_rules', {}).get('enabled', False):
-                client.loop.create_task(periodic_server_rules_update(server_rules_channel, bot_config, message_manager, bot_name, server_rules_update_interval))
+                add_job('rules', lambda: update_server_rules(server_rules_channel, bot_config, message_manager), server_rules_update_interval)
 
+            database_group = f"db:{database_label(database_config)}" if database_config else None
             if webhooks.get('killboard', {}).get('enabled', False):
-                client.loop.create_task(periodic_killboard_update(killboard_channel, bot_config, message_manager, bot_name, killboard_update_interval))
+                add_job(
+                    'killboard', lambda: update_killboard(killboard_channel, bot_config, message_manager, bot_name),
+                    killboard_update_interval, backoff_group=database_group
+                )
 
             if webhooks.get('guildwealth', {}).get('enabled', False):
-                client.loop.create_task(periodic_guildwealth_update(guildwealth_channel, bot_config, message_manager, bot_name, guildwealth_update_interval))
+                snapshot_interval = int(webhooks['guildwealth'].get('snapshot_interval', 600))
+                shared_jobs.append(get_guild_wealth_index(database_config).start(database_config, bot_name, snapshot_interval))
+                add_job(
+                    'guildwealth', lambda: update_guildwealth(guildwealth_channel, bot_config, message_manager, bot_name),
+                    guildwealth_update_interval, backoff_group=database_group
+                )
+
+            kill_feed_config = webhooks.get('killfeed', {})
+            for callback in kill_feed_subscriptions:
+                get_kill_feed(database_config).unsubscribe(callback)
+            kill_feed_subscriptions.clear()
+            if kill_feed_config.get('enabled', False):
+                kill_feed_channel = client.get_channel(int(kill_feed_config['channel_id']))
+                if kill_feed_channel is None:
+                    logger.error("Kill feed channel %s could not be found.", kill_feed_config['channel_id'])
+                else:
+                    # One tail of chars_deathlog per database; each bot batches what it sees into one post per window
+                    feed_channel = KillFeedChannel(kill_feed_channel, outbound, bot_name, int(kill_feed_config.get('max_lines', 40)))
+                    get_kill_feed(database_config).subscribe(feed_channel.add, float(kill_feed_config.get('poll_interval', 5)))
+                    kill_feed_subscriptions.append(feed_channel.add)
+                    shared_jobs.append(get_kill_feed(database_config).job_name)
+                    add_job('killfeed', feed_channel.flush, int(kill_feed_config.get('flush_interval', 30)))
+
+            add_job('responses', chat_bot.check_responses, int(bot_config.get('responses_reload_interval', 5)))
 
-            client.loop.create_task(periodic_presence_update(client, bot_config, 0, bot_name))
+            server_subscriptions[presence_renderer(client, bot_config, bot_name)] = 60
+
+            if population is not None:
+                server_subscriptions[population_recorder(population)] = 60
+
+            for callback, interval in server_subscriptions.items():
+                server_poller.subscribe(callback, interval)
+            server_poller.start()
+            visible_jobs[:] = bot_jobs + shared_jobs
 
         except Exception as e:
             logger.error("Error while setting up bot: %s", e)
 
+    @client.event
+    async def on_disconnect():
+        bot_states[bot_name] = "disconnected"
+
+    @client.event
+    async def on_resumed():
+        bot_states[bot_name] = "ready"
+
     @client.event
     async def on_message(message):
         if message.author.bot:
             return
-        response = await chat_bot.handle_message(message)
-        if response:
-            await message.channel.send(response)
+        await chat_bot.handle_message(message)
         await client.process_commands(message)
 
     # ---------------- Periodic Tasks ----------------
@@ -250,139 +463,220 @@ async def setup_discord_bot(message_manager, bot_name, bot_token, bot_config):
         await client.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name=status_message))
         logging.info(f"Updated presence: {status_message}")
 
-    async def periodic_presence_update(client, bot_config, stagger_delay, bot_name):
-        await client.wait_until_ready()
-        while not client.is_closed():
-            try:
-                players_online, max_players, server_online = await get_server_info({
-                    'server_ip': bot_config['server_ip'],
-                    'query_port': bot_config['query_port']
-                })
-                if server_online:
-                    await update_bot_presence(client, players_online, max_players, bot_config['conditionals'])
-                else:
-                    await update_bot_presence(client, None, None, bot_config['conditionals'])
-                await asyncio.sleep(60 + stagger_delay)
-            except Exception as e:
-                logging.error(f"{bot_name} | Presence error: {e}")
-                await asyncio.sleep(30)
+    def presence_renderer(client, bot_config, bot_name):
+        previous_message = None
 
-    async def periodic_server_status_update(client, channel, bot_config, message_manager, bot_name, update_interval):
-        await client.wait_until_ready()
+        async def render(snapshot):
+            nonlocal previous_message
+            players_online, max_players = (snapshot.player_count, snapshot.max_players) if snapshot.online else (None, None)
+            status_message = get_status_message(players_online, max_players, bot_config['conditionals'])
+            if status_message != previous_message:
+                await update_bot_presence(client, players_online, max_players, bot_config['conditionals'])
+                previous_message = status_message
+        return render
+
+    def server_status_renderer(channel, bot_config, message_manager, bot_name):
         previous_status = None
-        while not client.is_closed():
-            try:
-                players_online, max_players, server_online = await get_server_info({
-                    'server_ip': bot_config['server_ip'],
-                    'query_port': bot_config['query_port']
-                })
-                if server_online != previous_status:
-                    embed = discord.Embed(title="Server Status", color=0x00FF00 if server_online else 0xFF0000)
-                    embed.description = "Server is " + ("Online!" if server_online else "Offline.")
-                    image_url = bot_config['webhooks']['server_status'].get(
-                        'server_online_image' if server_online else 'server_offline_image'
-                    )
-                    if image_url:
-                        embed.set_image(url=image_url)
-                    embed.set_thumbnail(url="https://i.ibb.co/VC2vTMw/botimage.png")
-                    await message_manager.get_or_create_message(channel, embed, "status")
-                    previous_status = server_online
-            except Exception as e:
-                print(f"Status update error: {e}")
-                await asyncio.sleep(5)
-            await asyncio.sleep(update_interval)
 
-    async def periodic_server_info_update(channel, bot_config, message_manager, bot_name, update_interval):
-        await client.wait_until_ready()
+        async def render(snapshot):
+            nonlocal previous_status
+            server_online = snapshot.online
+            if server_online != previous_status:
+                embed = discord.Embed(title="Server Status", color=0x00FF00 if server_online else 0xFF0000)
+                embed.description = "Server is " + ("Online!" if server_online else "Offline.")
+                image_url = bot_config['webhooks']['server_status'].get(
+                    'server_online_image' if server_online else 'server_offline_image'
+                )
+                if image_url:
+                    embed.set_image(url=image_url)
+                embed.set_thumbnail(url="https://i.ibb.co/VC2vTMw/botimage.png")
+                await message_manager.get_or_create_message(channel, embed, "status")
+                previous_status = server_online
+        return render
+
+    def population_recorder(population):
+        # One per bot so each bot can unsubscribe its own; the history ignores repeats of a snapshot
+        async def record(snapshot):
+            await population.record(snapshot)
+        return record
+
+    def server_info_renderer(channel, bot_config, message_manager, bot_name):
         previous_info = None
-        while not client.is_closed():
-            try:
-                players_online, max_players, server_online = await get_server_info({
-                    'server_ip': bot_config['server_ip'],
-                    'query_port': bot_config['query_port']
-                })
-                current_info = {"players_online": players_online, "max_players": max_players, "server_online": server_online}
-                if current_info != previous_info:
-                    embed = discord.Embed(title="Server Information", color=0x00FF00 if server_online else 0xFF0000)
-                    embed.description = "Server is Online!" if server_online else "Server is Down..."
-                    embed.add_field(name="Server Name", value=bot_config.get('server_name', 'Unknown'), inline=False)
-                    embed.add_field(name="Server IP", value=bot_config.get('server_ip', 'Unknown'), inline=False)
-                    embed.add_field(name="Connect Port", value=bot_config.get('server_port', 'Unknown'), inline=False)
-                    embed.add_field(name="Last Wipe", value=bot_config.get('last_wipe', 'Unknown'), inline=False)
-                    embed.add_field(name="Next Wipe", value=bot_config.get('next_wipe', 'Unknown'), inline=False)
-                    embed.add_field(name="Players Online", value=f"{players_online}/{max_players}", inline=False)
-                    embed.add_field(name="Map Name", value=bot_config.get('map_name', 'Unknown'), inline=False)
-                    embed.add_field(name="Live Map", value=bot_config.get('livemap', 'None'), inline=False)
-                    embed.set_thumbnail(url="https://i.ibb.co/VC2vTMw/botimage.png")
-                    if bot_config.get('map_image'):
-                        embed.set_image(url=bot_config['map_image'])
-                    await message_manager.get_or_create_message(channel, embed, "info")
-                    previous_info = current_info
-            except Exception as e:
-                print(f"Info update error: {e}")
-                await asyncio.sleep(500)
-            await asyncio.sleep(update_interval)
 
-    async def periodic_server_rules_update(channel, bot_config, message_manager, bot_name, update_interval):
-        await client.wait_until_ready()
-        while not client.is_closed():
-            try:
-                current_rules = bot_config.get('rules', [])
-                embed = discord.Embed(title="Server Rules", color=0x00FF00)
-                embed.description = "\n".join([f"{i+1}. {rule}" for i, rule in enumerate(current_rules)])
+        async def render(snapshot):
+            nonlocal previous_info
+            players_online, max_players, server_online = snapshot.player_count, snapshot.max_players, snapshot.online
+            population_summary = population.summary(86400) if population is not None else None
+            if population_summary is not None:
+                population_summary = (population_summary[0], round(population_summary[1]))
+            current_info = {
+                "players_online": players_online, "max_players": max_players, "server_online": server_online,
+                "population": population_summary
+            }
+            if current_info != previous_info:
+                embed = discord.Embed(title="Server Information", color=0x00FF00 if server_online else 0xFF0000)
+                embed.description = "Server is Online!" if server_online else "Server is Down..."
+                embed.add_field(name="Server Name", value=bot_config.get('server_name', 'Unknown'), inline=False)
+                embed.add_field(name="Server IP", value=bot_config.get('server_ip', 'Unknown'), inline=False)
+                embed.add_field(name="Connect Port", value=bot_config.get('server_port', 'Unknown'), inline=False)
+                embed.add_field(name="Last Wipe", value=bot_config.get('last_wipe', 'Unknown'), inline=False)
+                embed.add_field(name="Next Wipe", value=bot_config.get('next_wipe', 'Unknown'), inline=False)
+                embed.add_field(name="Players Online", value=f"{players_online}/{max_players}", inline=False)
+                if population_summary is not None:
+                    embed.add_field(name="Last 24 Hours", value=f"Peak: {population_summary[0]} | Average: {population_summary[1]}", inline=False)
+                embed.add_field(name="Map Name", value=bot_config.get('map_name', 'Unknown'), inline=False)
+                embed.add_field(name="Live Map", value=bot_config.get('livemap', 'None'), inline=False)
                 embed.set_thumbnail(url="https://i.ibb.co/VC2vTMw/botimage.png")
-                rules_image_url = bot_config['webhooks']['server_rules'].get('rules_image')
-                if rules_image_url:
-                    embed.set_image(url=rules_image_url)
-                await message_manager.get_or_create_message(channel, embed, "rules")
-            except Exception as e:
-                print(f"Rules update error: {e}")
-            await asyncio.sleep(update_interval)
-
-    async def periodic_killboard_update(channel, bot_config, message_manager, bot_name, interval):
-        await client.wait_until_ready()
-        while not client.is_closed():
-            kills_data = await fetch_kills_data(bot_config, bot_name)
-            embed = discord.Embed(title=f"{bot_name} Killboard", color=discord.Color.purple())
-            for record in kills_data:
-                embed.add_field(
-                    name=f"{record['name']} {record['lastname']}",
-                    value=f"Kills: {record['kills']} | Deaths: {record['deaths']} | TK: {record['team_kills']} | K/D: {record['kd_ratio']:.2f}",
-                    inline=False
-                )
-            embed.set_thumbnail(url="https://i.ibb.co/VC2vTMw/botimage.png")
-            killboard_image = bot_config['webhooks']['killboard'].get('killboard_image')
-            if killboard_image:
-                embed.set_image(url=killboard_image)
-            await message_manager.get_or_create_message(channel, embed, "killboard")
-            await asyncio.sleep(interval)
+                if bot_config.get('map_image'):
+                    embed.set_image(url=bot_config['map_image'])
+                await message_manager.get_or_create_message(channel, embed, "info")
+                previous_info = current_info
+        return render
+
+    async def update_server_rules(channel, bot_config, message_manager):
+        current_rules = bot_config.get('rules', [])
+        embed = discord.Embed(title="Server Rules", color=0x00FF00)
+        embed.description = "\n".join([f"{i+1}. {rule}" for i, rule in enumerate(current_rules)])
+        embed.set_thumbnail(url="https://i.ibb.co/VC2vTMw/botimage.png")
+        rules_image_url = bot_config['webhooks']['server_rules'].get('rules_image')
+        if rules_image_url:
+            embed.set_image(url=rules_image_url)
+        await message_manager.get_or_create_message(channel, embed, "rules")
+
+    async def update_killboard(channel, bot_config, message_manager, bot_name):
+        # Database errors propagate so the scheduler backs off, leaving the last posted board up.
+        # The TTL sits below the job's shortest jittered interval, so every tick shows fresh data
+        # while bots sharing the database within one tick reuse a single refresh. While the
+        # breaker is open the cache serves the last good result instead.
+        top = await cached_top(
+            bot_config['database'], bot_config['webhooks']['killboard'].get('state_file'), 10,
+            ttl=killboard_update_interval * 0.8
+        )
+        embed = discord.Embed(title=f"{bot_name} Killboard", color=discord.Color.purple())
+        for record in top:
+            embed.add_field(
+                name=f"{record['name']} {record['lastname']}",
+                value=f"Kills: {record['kills']} | Deaths: {record['deaths']} | TK: {record['team_kills']} | K/D: {record['kd_ratio']:.2f}",
+                inline=False
+            )
+        embed.set_thumbnail(url="https://i.ibb.co/VC2vTMw/botimage.png")
+        killboard_image = bot_config['webhooks']['killboard'].get('killboard_image')
+        if killboard_image:
+            embed.set_image(url=killboard_image)
+        await message_manager.get_or_create_message(channel, embed, "killboard")
 
     try:
         await client.start(bot_token)
     except Exception as e:
         print(f"Failed to start bot: {e}")
     finally:
+        for callback in server_subscriptions:
+            server_poller.unsubscribe(callback)
+        for job_name in bot_jobs:
+            scheduler.remove(job_name)
+        for callback in kill_feed_subscriptions:
+            get_kill_feed(database_config).unsubscribe(callback)
+        if database_config and webhooks.get('guildwealth', {}).get('enabled', False):
+            get_guild_wealth_index(database_config).stop(database_config, bot_name)
         await client.close()
+        await outbound.close()
+        if population is not None:
+            population.flush()
+        if database_config:
+            await release_pool(database_config)
+        bot_states[bot_name] = "closed"
         print(f"{bot_name} | Bot closed.")
 
 
-# ---------------- Entrypoint ----------------
-if __name__ == '__main__':
-    async def main():
-        bots_directory = 'Bots'
-        bot_file = 'bot.json'
-        bot_path = os.path.join(bots_directory, bot_file)
+# ---------------- Multi-Bot Runner ----------------
+def load_bot_configs(bots_directory='Bots', bot_files=None):
+    """Load (bot_name, bot_config) pairs for the given files, or for every *.json in bots_directory."""
+    if bot_files is None:
+        bot_files = sorted(f for f in os.listdir(bots_directory) if f.endswith('.json'))
 
+    bot_configs = []
+    for bot_file in bot_files:
+        bot_path = os.path.join(bots_directory, bot_file)
         if not os.path.exists(bot_path):
             raise FileNotFoundError(f"Config not found: {bot_path}")
 
         with open(bot_path, 'r') as f:
             bot_config = json.load(f)
+        bot_configs.append((os.path.splitext(bot_file)[0], bot_config))
+    return bot_configs
+
+
+def configure_logging(bot_configs):
+    """Set up process-wide logging from the first config's "logging" section."""
+    logging_config = bot_configs[0][1].get('logging', {}) if bot_configs else {}
+    setup_logging(
+        logging_config.get('level', 'INFO'),
+        logging_config.get('json', False),
+        float(logging_config.get('message_log_rate', 5)),
+        int(logging_config.get('message_log_burst', 20))
+    )
+
+
+async def run_bots(bot_configs, stagger_delay=5, metrics_port_offset=0):
+    """Run every bot on this event loop, staggering logins so they don't all hit the gateway at once.
+
+    Bots pointed at the same game server share one A2S poller, bots pointed at the same
+    database share one connection pool, and bots using the same response file share one
+    loaded copy of it.
+    """
+    # One metrics endpoint per process, configured by the first bot that enables it. Launcher
+    # workers each add their worker number to the port so they don't all bind the same one.
+    for _, bot_config in bot_configs:
+        metrics_config = bot_config.get('metrics', {})
+        if metrics_config.get('enabled', False):
+            host = metrics_config.get('host', '127.0.0.1')
+            port = int(metrics_config.get('port', 9108)) + metrics_port_offset
+            try:
+                await start_metrics_server(host, port)
+            except OSError as e:
+                # Metrics are optional; the bots run without them
+                logging.error(f"Could not serve metrics on {host}:{port}: {e}")
+            break
+
+    # Every bot shares this loop, so one watchdog covers them all
+    watchdog_config = bot_configs[0][1].get('watchdog', {}) if bot_configs else {}
+    if watchdog_config.get('enabled', True):
+        get_watchdog(float(watchdog_config.get('threshold', 0.25))).start()
+
+    async def start_bot(index, bot_name, bot_config):
+        await asyncio.sleep(index * stagger_delay)
+        try:
+            message_manager = MessageManager(
+                max_edit_age=bot_config.get('dashboard_max_age', 3600),
+                bot_name=bot_name,
+                message_cache=MessageCache(int(bot_config.get('dashboard_cache_size', 10))),
+                registry=get_message_registry(bot_config.get('message_registry', os.path.join('data', 'messages.sqlite3')))
+            )
+            await setup_discord_bot(message_manager, bot_name, bot_config['bot_token'], bot_config)
+        except Exception as e:
+            logging.error(f"{bot_name} | Bot stopped with error: {e}")
 
-        bot_name = os.path.splitext(bot_file)[0]
-        bot_token = bot_config['bot_token']
+    try:
+        await asyncio.gather(*(
+            start_bot(index, bot_name, bot_config)
+            for index, (bot_name, bot_config) in enumerate(bot_configs)
+        ))
+    finally:
+        # Every bot's poller shares this socket, so it closes once they have all stopped
+        get_a2s_client().close()
 
-        message_manager = MessageManager()
-        await setup_discord_bot(message_manager, bot_name, bot_token, bot_config)
 
-    asyncio.run(main())
+# ---------------- Entrypoint ----------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run Corevion bots.")
+    parser.add_argument('--all', action='store_true', help="Run every config in the bots directory from this process.")
+    parser.add_argument('--bots-dir', default='Bots', help="Directory holding the bot configs.")
+    parser.add_argument('--config', default='bot.json', help="Config file to run when --all is not given.")
+    parser.add_argument('--stagger', type=float, default=5, help="Seconds between bot logins in multi-bot mode.")
+    args = parser.parse_args()
+
+    bot_files = None if args.all else [args.config]
+    setup_logging()
+    bot_configs = load_bot_configs(args.bots_dir, bot_files)
+    configure_logging(bot_configs)
+    asyncio.run(run_bots(bot_configs, args.stagger))
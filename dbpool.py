@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from contextvars import ContextVar
+import aiomysql
+from metrics import DB_CIRCUIT_STATE, DB_QUERY_ERRORS, DB_QUERY_SECONDS, DB_QUERY_TIMEOUTS
+
+# The database config and connection of the innermost acquire(), so execute() knows its deadline and breaker
+_CURRENT = ContextVar("dbpool_current", default=None)
+
+
+# ---------------- Database Pools ----------------
+# One aiomysql pool per database, shared by every bot in the process that points at it.
+_pools = {}
+_pool_locks = {}
+_pool_users = {}
+
+
+def database_label(db_config):
+    """Short name for a database in logs, job names and backoff groups."""
+    return f"{db_config['database_address']}:{db_config['database_port']}/{db_config['database_name']}"
+
+
+def pool_key(db_config):
+    """Identify a database by where it lives and who we log in as, so matching configs share a pool."""
+    return (
+        db_config['database_address'],
+        int(db_config['database_port']),
+        db_config['database_user'],
+        db_config['database_name'],
+    )
+
+
+async def get_pool(db_config):
+    """Return the shared pool for a database config, creating it on first use."""
+    key = pool_key(db_config)
+    lock = _pool_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = await aiomysql.create_pool(
+                host=db_config['database_address'],
+                port=int(db_config['database_port']),
+                user=db_config['database_user'],
+                password=db_config['database_password'],
+                db=db_config['database_name'],
+                minsize=int(db_config.get('pool_minsize', 1)),
+                maxsize=int(db_config.get('pool_maxsize', 5)),
+                pool_recycle=int(db_config.get('pool_recycle', 3600)),
+                autocommit=True
+            )
+            _pools[key] = pool
+            logging.info(f"Created database pool for {key[3]}@{key[0]}:{key[1]}")
+    return pool
+
+
+def install_pool(db_config, pool):
+    """Use an already-created pool (or a stand-in with the same interface) for a database config."""
+    _pools[pool_key(db_config)] = pool
+
+
+@asynccontextmanager
+async def acquire(db_config):
+    """Yield a pooled connection, pinging it first so one dropped by MySQL is reconnected before use.
+
+    Raises CircuitOpenError without touching MySQL while the database's breaker is open. Failing
+    to create the pool, get a connection or ping it counts against the breaker, so an outage
+    opens it rather than every tick trying to connect again.
+    """
+    breaker = get_breaker(db_config)
+    breaker.check()
+    async with AsyncExitStack() as stack:
+        try:
+            pool = await get_pool(db_config)
+            connection = await stack.enter_async_context(pool.acquire())
+            await connection.ping(reconnect=True)
+        except Exception as e:
+            breaker.record_failure(f"could not connect: {e}")
+            raise
+        token = _CURRENT.set((db_config, connection))
+        try:
+            yield connection
+        finally:
+            _CURRENT.reset(token)
+
+
+def retain_pool(db_config):
+    """Record that a bot uses this database, so its pool stays open until every user releases it."""
+    key = pool_key(db_config)
+    _pool_users[key] = _pool_users.get(key, 0) + 1
+
+
+async def release_pool(db_config):
+    """Drop a bot's use of this database and close the pool once nobody uses it."""
+    key = pool_key(db_config)
+    _pool_users[key] = _pool_users.get(key, 1) - 1
+    if _pool_users[key] > 0:
+        return
+    del _pool_users[key]
+    pool = _pools.pop(key, None)
+    if pool is not None:
+        pool.close()
+        await pool.wait_closed()
+        logging.info(f"Closed database pool for {key[3]}@{key[0]}:{key[1]}")
+
+
+# ---------------- Circuit Breaker ----------------
+class CircuitOpenError(Exception):
+    """Raised instead of querying a database whose breaker is open."""
+
+
+class QueryTimeoutError(Exception):
+    """A query ran past its deadline and was killed on the server."""
+
+
+class CircuitBreaker:
+    """Stops the bots from adding load to a database that is failing or slow.
+
+    `failure_threshold` failed connections, or failed or slow queries, in a row open the breaker;
+    while open every acquire() fails fast. After `reset_timeout` seconds one caller is let through as a probe:
+    if its queries succeed the breaker closes, otherwise it opens again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, label, failure_threshold=3, reset_timeout=60):
+        self.label = label
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def _set_state(self, state):
+        self.state = state
+        DB_CIRCUIT_STATE.set(state, database=self.label)
+
+    def check(self):
+        if self.state == self.CLOSED:
+            return
+        # A probe that never reported back (e.g. it was cancelled) doesn't block the next one
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+            self.opened_at = time.monotonic()
+            logging.info(f"Database {self.label} circuit half-open, probing")
+            return
+        raise CircuitOpenError(f"Database {self.label} circuit is open")
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logging.info(f"Database {self.label} circuit closed")
+        self.failures = 0
+        self._set_state(self.CLOSED)
+
+    def record_failure(self, reason):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logging.error(f"Database {self.label} circuit opened after {self.failures} failures ({reason}); retrying in {self.reset_timeout}s")
+            self._set_state(self.OPEN)
+            self.opened_at = time.monotonic()
+
+
+_breakers = {}
+
+
+def get_breaker(db_config):
+    """Return the process-wide circuit breaker for a database."""
+    key = pool_key(db_config)
+    if key not in _breakers:
+        _breakers[key] = CircuitBreaker(
+            database_label(db_config),
+            failure_threshold=int(db_config.get('breaker_failures', 3)),
+            reset_timeout=float(db_config.get('breaker_reset', 60))
+        )
+    return _breakers[key]
+
+
+# ---------------- Queries ----------------
+async def _kill_query(db_config, connection):
+    """Stop the statement a connection is running with KILL QUERY, from a separate short-lived connection."""
+    try:
+        killer = await aiomysql.connect(
+            host=db_config['database_address'],
+            port=int(db_config['database_port']),
+            user=db_config['database_user'],
+            password=db_config['database_password'],
+            connect_timeout=5
+        )
+        try:
+            async with killer.cursor() as cursor:
+                await cursor.execute("KILL QUERY %s", (connection.thread_id(),))
+        finally:
+            killer.close()
+    except Exception as e:
+        logging.error(f"Could not kill timed out query on {database_label(db_config)}: {e}")
+
+
+async def execute(cursor, query_name, query, params=None, timeout=None):
+    """Run a query on a cursor, recording its duration and failures under query_name.
+
+    The query gets `timeout` seconds (the database's "query_timeout", default 30, if None). Past
+    that it is killed on the server, its connection is dropped and QueryTimeoutError is raised.
+    Failures, timeouts and queries slower than "slow_query_seconds" count against the breaker;
+    a query given its own `timeout` is expected to be slow, so only its failures and timeout count.
+    """
+    db_config, connection = _CURRENT.get() or (None, None)
+    breaker = get_breaker(db_config) if db_config else None
+    expected_slow = timeout is not None
+    if timeout is None and db_config:
+        timeout = float(db_config.get('query_timeout', 30))
+    started = time.monotonic()
+    try:
+        with DB_QUERY_SECONDS.time(query=query_name):
+            await asyncio.wait_for(cursor.execute(query, params), timeout)
+    except asyncio.TimeoutError:
+        DB_QUERY_TIMEOUTS.inc(query=query_name)
+        DB_QUERY_ERRORS.inc(query=query_name)
+        if breaker:
+            breaker.record_failure(f"{query_name} timed out")
+            await _kill_query(db_config, connection)
+            # The connection was cut off mid-result; closing it keeps it out of the pool
+            connection.close()
+        raise QueryTimeoutError(f"{query_name} ran past its {timeout:g}s deadline") from None
+    except Exception:
+        DB_QUERY_ERRORS.inc(query=query_name)
+        if breaker:
+            breaker.record_failure(f"{query_name} failed")
+        raise
+    if breaker:
+        duration = time.monotonic() - started
+        if not expected_slow and duration > float(db_config.get('slow_query_seconds', 10)):
+            breaker.record_failure(f"{query_name} took {duration:.1f}s")
+        else:
+            breaker.record_success()
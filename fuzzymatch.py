@@ -0,0 +1,136 @@
+import logging
+import math
+import re
+import time
+from collections import Counter
+from responseindex import required_literals
+
+try:
+    import numpy as np
+except ImportError:  # Fuzzy matching is optional; without NumPy only the regex path runs
+    np = None
+
+# Regex syntax stripped from patterns that aren't plain `.*`-joined literals
+_REGEX_SYNTAX = re.compile(r'\\[A-Za-z]|[.^$*+?{}\[\]|()\\]')
+_WORD = re.compile(r'\w+')
+
+
+def available():
+    return np is not None
+
+
+def pattern_phrase(pattern):
+    """Turn a response regex into the plain words it is looking for."""
+    literals = required_literals(pattern)
+    if literals is not None:
+        return " ".join(literals)
+    return _REGEX_SYNTAX.sub(" ", pattern).lower()
+
+
+def char_ngrams(text, n=3):
+    """Character n-grams of each word, padded with spaces so word starts and ends count."""
+    grams = Counter()
+    for word in _WORD.findall(text.lower()):
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams[padded] += 1
+            continue
+        for start in range(len(padded) - n + 1):
+            grams[padded[start:start + n]] += 1
+    return grams
+
+
+class FuzzyIndex:
+    """TF-IDF over character n-grams of every intent's patterns and sample phrases.
+
+    Stored as an inverted index: for each n-gram, the phrases containing it and their weights.
+    Scoring a message gathers the postings of its n-grams and sums them per phrase with one
+    np.bincount, so the cost depends on the message length rather than the number of intents.
+    An intent scores as its best phrase (cosine similarity, 0 to 1).
+    """
+
+    def __init__(self, responses, n=3):
+        started = time.perf_counter()
+        self.n = n
+        self.intents = []
+        phrases = []
+        phrase_intents = []
+        for item in responses if isinstance(responses, list) else []:
+            if not (isinstance(item, dict) and 'intent' in item and 'responses' in item):
+                continue
+            texts = [pattern_phrase(pattern) for pattern in item.get("regex", [])] + list(item.get("samples", []))
+            texts = [text for text in texts if char_ngrams(text, n)]
+            if not texts:
+                continue
+            for text in texts:
+                phrases.append(text)
+                phrase_intents.append(len(self.intents))
+            self.intents.append(item)
+
+        self.phrases = phrases
+        self.phrase_count = len(phrases)
+        documents = [char_ngrams(text, n) for text in phrases]
+        document_frequency = Counter()
+        for grams in documents:
+            document_frequency.update(grams.keys())
+        self.idf = {
+            gram: math.log((1 + self.phrase_count) / (1 + frequency)) + 1
+            for gram, frequency in document_frequency.items()
+        }
+        # Weight of an n-gram no phrase contains; it only counts towards the message's norm
+        self.unknown_idf = math.log(1 + self.phrase_count) + 1
+
+        postings = {}
+        for phrase_id, grams in enumerate(documents):
+            weights = {gram: (1 + math.log(count)) * self.idf[gram] for gram, count in grams.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            for gram, weight in weights.items():
+                postings.setdefault(gram, ([], []))
+                postings[gram][0].append(phrase_id)
+                postings[gram][1].append(weight / norm)
+        self.postings = {
+            gram: (np.array(ids, dtype=np.intp), np.array(weights, dtype=np.float64))
+            for gram, (ids, weights) in postings.items()
+        }
+        self.phrase_intents = np.array(phrase_intents, dtype=np.intp)
+        # Phrases are grouped by intent, so each intent's best phrase is a maximum over a contiguous slice
+        self.intent_starts = np.flatnonzero(np.r_[True, self.phrase_intents[1:] != self.phrase_intents[:-1]]) \
+            if self.phrase_count else np.array([], dtype=np.intp)
+        logging.info(
+            f"Built fuzzy index: {len(self.intents)} intents, {self.phrase_count} phrases, "
+            f"{len(self.postings)} n-grams in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+
+    def _phrase_scores(self, text):
+        """Cosine similarity of text to every phrase."""
+        ids = []
+        weights = []
+        norm = 0.0
+        for gram, count in char_ngrams(text, self.n).items():
+            entry = self.postings.get(gram)
+            weight = (1 + math.log(count)) * (self.idf[gram] if entry is not None else self.unknown_idf)
+            norm += weight * weight
+            if entry is not None:
+                ids.append(entry[0])
+                weights.append(entry[1] * weight)
+        if not ids:
+            return None
+        return np.bincount(np.concatenate(ids), np.concatenate(weights), minlength=self.phrase_count) / math.sqrt(norm)
+
+    def scores(self, text):
+        """Return the best cosine similarity of text to each intent, as an array in intent order."""
+        phrase_scores = self._phrase_scores(text) if self.phrase_count else None
+        if phrase_scores is None:
+            return np.zeros(len(self.intents))
+        return np.maximum.reduceat(phrase_scores, self.intent_starts)
+
+    def match(self, text, threshold):
+        """Return (intent item, closest phrase, score) if the best phrase scores at least threshold, else None."""
+        phrase_scores = self._phrase_scores(text) if self.phrase_count else None
+        if phrase_scores is None:
+            return None
+        best = int(np.argmax(phrase_scores))
+        score = float(phrase_scores[best])
+        if score < threshold:
+            return None
+        return self.intents[self.phrase_intents[best]], self.phrases[best], score
@@ -0,0 +1,312 @@
+import asyncio
+import bisect
+import heapq
+import json
+import logging
+import os
+import aiomysql
+from dbpool import acquire, execute, pool_key
+from resultcache import get_result_cache
+
+# chars_deathlog uses this KillerID for deaths that no character caused
+ENVIRONMENT_KILLER_ID = 4294967294
+# Prefixes up to this long match too many names to scan, so their best-ranked characters are kept ahead of time
+SHORT_PREFIX = 2
+SHORT_PREFIX_KEEP = 10
+# Deadline for the one-off full aggregates of a rebuild; incremental reads use the database's query_timeout
+REBUILD_QUERY_TIMEOUT = 300
+
+
+# ---------------- Character Stats ----------------
+class CharacterStats:
+    __slots__ = ('char_id', 'name', 'lastname', 'guild_id', 'kills', 'deaths', 'team_kills')
+
+    def __init__(self, char_id, name=None, lastname=None, guild_id=None, kills=0, deaths=0, team_kills=0):
+        self.char_id = char_id
+        self.name = name
+        self.lastname = lastname
+        self.guild_id = guild_id
+        self.kills = kills
+        self.deaths = deaths
+        self.team_kills = team_kills
+
+    @property
+    def kd_ratio(self):
+        if self.deaths == 0:
+            return float(self.kills)
+        return round(self.kills / self.deaths, 2)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "lastname": self.lastname,
+            "kills": self.kills,
+            "deaths": self.deaths,
+            "team_kills": self.team_kills,
+            "kd_ratio": self.kd_ratio
+        }
+
+
+# ---------------- Killboard Index ----------------
+class KillboardIndex:
+    """Per-character kill counters kept up to date from chars_deathlog rows past a high-water mark.
+
+    A full rebuild only runs when the index is first loaded with no saved state, or when the
+    deathlog's highest ID drops below the mark (a wipe). Every other refresh reads new rows only.
+    """
+
+    def __init__(self, persist_path=None, batch_size=1000):
+        self.persist_path = persist_path
+        self.batch_size = batch_size
+        self.stats = {}
+        self.last_death_id = 0
+        self.loaded = False
+        self._lock = asyncio.Lock()
+        # (sorted (name key, char_id) pairs, {char_id: rank}, {short prefix: best char_ids}), rebuilt after changes
+        self._lookup = None
+
+    def _character(self, char_id, name=None, lastname=None, guild_id=None, stats_by_id=None):
+        if stats_by_id is None:
+            stats_by_id = self.stats
+        stats = stats_by_id.get(char_id)
+        if stats is None:
+            stats = stats_by_id[char_id] = CharacterStats(char_id)
+        if name is not None:
+            stats.name, stats.lastname, stats.guild_id = name, lastname, guild_id
+        return stats
+
+    async def refresh(self, db_config):
+        """Bring the counters up to date; returns True if anything changed."""
+        async with self._lock:
+            if not self.loaded:
+                self._load()
+            async with acquire(db_config) as connection:
+                async with connection.cursor(aiomysql.DictCursor) as cursor:
+                    await execute(cursor, "killboard_max_id", "SELECT MAX(ID) AS max_id FROM chars_deathlog")
+                    max_id = (await cursor.fetchone())["max_id"] or 0
+
+                    if not self.loaded or max_id < self.last_death_id:
+                        await self._rebuild(cursor, max_id)
+                        changed = True
+                    else:
+                        changed = await self._apply_new_rows(cursor, max_id)
+            self.loaded = True
+            if changed:
+                self._lookup = None
+                await self._save()
+            # Built here, on the refresh job, so no /kd call pays for the sort
+            self._lookup_tables()
+            return changed
+
+    async def _rebuild(self, cursor, max_id):
+        logging.info(f"Rebuilding killboard index up to deathlog ID {max_id}")
+        # Built aside and swapped in at the end: /kd keeps reading the old stats while the queries run
+        stats_by_id = {}
+        await execute(cursor, "killboard_characters", "SELECT ID, Name, Lastname, GuildID FROM `character`", timeout=REBUILD_QUERY_TIMEOUT)
+        for row in await cursor.fetchall():
+            self._character(row["ID"], row["Name"], row["Lastname"], row["GuildID"], stats_by_id)
+
+        await execute(cursor, "killboard_rebuild_kills", """
+            SELECT
+                d.KillerID AS char_id,
+                COALESCE(SUM(killer.GuildID <> victim.GuildID), 0) AS kills,
+                COALESCE(SUM(killer.GuildID = victim.GuildID), 0) AS team_kills
+            FROM chars_deathlog d
+            JOIN `character` killer ON killer.ID = d.KillerID
+            JOIN `character` victim ON victim.ID = d.CharID
+            WHERE d.ID <= %s AND d.KillerID <> %s
+            GROUP BY d.KillerID
+        """, (max_id, ENVIRONMENT_KILLER_ID), timeout=REBUILD_QUERY_TIMEOUT)
+        for row in await cursor.fetchall():
+            stats = self._character(row["char_id"], stats_by_id=stats_by_id)
+            stats.kills, stats.team_kills = int(row["kills"]), int(row["team_kills"])
+
+        await execute(cursor, "killboard_rebuild_deaths", """
+            SELECT d.CharID AS char_id, COUNT(*) AS deaths
+            FROM chars_deathlog d
+            JOIN `character` killer ON killer.ID = d.KillerID
+            JOIN `character` victim ON victim.ID = d.CharID
+            WHERE d.ID <= %s AND d.KillerID <> %s
+            GROUP BY d.CharID
+        """, (max_id, ENVIRONMENT_KILLER_ID), timeout=REBUILD_QUERY_TIMEOUT)
+        for row in await cursor.fetchall():
+            self._character(row["char_id"], stats_by_id=stats_by_id).deaths = int(row["deaths"])
+
+        self.stats, self._lookup = stats_by_id, None
+        self.last_death_id = max_id
+
+    async def _apply_new_rows(self, cursor, max_id):
+        changed = False
+        while self.last_death_id < max_id:
+            await execute(cursor, "killboard_new_deaths", """
+                SELECT
+                    d.ID, d.CharID, d.KillerID,
+                    killer.Name AS KillerName, killer.Lastname AS KillerLastname, killer.GuildID AS KillerGuildID,
+                    victim.Name AS VictimName, victim.Lastname AS VictimLastname, victim.GuildID AS VictimGuildID
+                FROM chars_deathlog d
+                LEFT JOIN `character` killer ON killer.ID = d.KillerID
+                LEFT JOIN `character` victim ON victim.ID = d.CharID
+                WHERE d.ID > %s
+                ORDER BY d.ID
+                LIMIT %s
+            """, (self.last_death_id, self.batch_size))
+            rows = await cursor.fetchall()
+            if not rows:
+                break
+            for row in rows:
+                self._apply_row(row)
+            self.last_death_id = rows[-1]["ID"]
+            changed = True
+        return changed
+
+    def _apply_row(self, row):
+        # Mirrors the old GROUP BY query: both characters must exist and environment deaths don't count
+        if row["KillerID"] == ENVIRONMENT_KILLER_ID or row["KillerName"] is None or row["VictimName"] is None:
+            return
+        killer = self._character(row["KillerID"], row["KillerName"], row["KillerLastname"], row["KillerGuildID"])
+        victim = self._character(row["CharID"], row["VictimName"], row["VictimLastname"], row["VictimGuildID"])
+        victim.deaths += 1
+        # A NULL guild on either side counts as neither a kill nor a team kill, as it did in SQL
+        if killer.guild_id is None or victim.guild_id is None:
+            return
+        if killer.guild_id == victim.guild_id:
+            killer.team_kills += 1
+        else:
+            killer.kills += 1
+
+    def top(self, count=10):
+        """Return the top characters by kills as dicts of name, lastname, kills, deaths, team_kills and kd_ratio."""
+        killers = (stats for stats in self.stats.values() if stats.kills or stats.team_kills)
+        return [stats.to_dict() for stats in heapq.nlargest(count, killers, key=lambda stats: stats.kills)]
+
+    def _lookup_tables(self):
+        if self._lookup is None:
+            names = []
+            for stats in self.stats.values():
+                if stats.name is None:
+                    continue
+                for key in self._name_keys(stats):
+                    names.append((key, stats.char_id))
+            names.sort()
+            ranked = sorted(
+                (stats for stats in self.stats.values() if stats.name is not None),
+                key=lambda stats: (-stats.kills, stats.deaths, stats.char_id)
+            )
+            short_prefixes = {}
+            for stats in ranked:
+                prefixes = {key[:length] for key in self._name_keys(stats) for length in range(1, SHORT_PREFIX + 1)}
+                for prefix in prefixes:
+                    best = short_prefixes.setdefault(prefix, [])
+                    if len(best) < SHORT_PREFIX_KEEP:
+                        best.append(stats.char_id)
+            self._lookup = (names, {stats.char_id: rank for rank, stats in enumerate(ranked, 1)}, short_prefixes)
+        return self._lookup
+
+    @staticmethod
+    def _name_keys(stats):
+        full_name = f"{stats.name} {stats.lastname}" if stats.lastname else stats.name
+        keys = [full_name.casefold()]
+        if stats.lastname:
+            keys.append(stats.lastname.casefold())
+        return keys
+
+    def lookup(self, query, limit=5):
+        """Find characters whose full name or last name starts with query, ignoring case.
+
+        Returns up to `limit` (rank, CharacterStats) pairs, exact name matches first, then by rank.
+        Served entirely from memory from tables built by refresh; a prefix of one or two letters
+        reads its precomputed best characters instead of scanning every name that starts with it.
+        """
+        key = " ".join(query.split()).casefold()
+        if not key:
+            return []
+        names, ranks, short_prefixes = self._lookup_tables()
+        matches = {}
+        if len(key) <= SHORT_PREFIX:
+            for char_id in short_prefixes.get(key, ()):
+                matches[char_id] = False
+        start = bisect.bisect_left(names, (key,))
+        for position in range(start, len(names)):
+            name, char_id = names[position]
+            whole = name == key or name.startswith(key + " ")
+            if len(key) <= SHORT_PREFIX:
+                # Whole-name matches sort straight after the key itself; only those still need finding
+                if not whole:
+                    break
+            elif not name.startswith(key):
+                break
+            # A whole first name, last name or full name beats a partial one
+            matches[char_id] = matches.get(char_id, False) or whole
+        ordered = sorted(matches, key=lambda char_id: (not matches[char_id], ranks[char_id]))
+        return [(ranks[char_id], self.stats[char_id]) for char_id in ordered[:limit]]
+
+    @property
+    def ranked_count(self):
+        return len(self._lookup_tables()[1])
+
+    def _load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r') as f:
+                state = json.load(f)
+            self.last_death_id = state["last_death_id"]
+            self.stats = {
+                int(char_id): CharacterStats(int(char_id), *values)
+                for char_id, values in state["characters"].items()
+            }
+            self.loaded = True
+            logging.info(f"Loaded killboard index from {self.persist_path} at deathlog ID {self.last_death_id}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.error(f"Error loading killboard index from {self.persist_path}: {e}")
+
+    async def _save(self):
+        if not self.persist_path:
+            return
+        state = json.dumps({
+            "last_death_id": self.last_death_id,
+            "characters": {
+                stats.char_id: [stats.name, stats.lastname, stats.guild_id, stats.kills, stats.deaths, stats.team_kills]
+                for stats in self.stats.values()
+            }
+        })
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._write_state, state)
+        except OSError as e:
+            logging.error(f"Error saving killboard index to {self.persist_path}: {e}")
+
+    def _write_state(self, state):
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.persist_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(state)
+        os.replace(temp_path, self.persist_path)
+
+
+_killboards = {}
+
+
+def get_killboard(db_config, persist_path=None):
+    """Return the process-wide killboard index for a database, shared by every bot that uses it."""
+    key = pool_key(db_config)
+    if key not in _killboards:
+        _killboards[key] = KillboardIndex(persist_path)
+    return _killboards[key]
+
+
+async def cached_top(db_config, persist_path=None, count=10, ttl=0, stale_ttl=0):
+    """Refresh the shared killboard index and return its top characters, through the result cache.
+
+    Every bot on the same database asking within `ttl` seconds of the last refresh gets the
+    same list without touching MySQL.
+    """
+    killboard = get_killboard(db_config, persist_path)
+
+    async def load():
+        await killboard.refresh(db_config)
+        return killboard.top(count)
+
+    return await get_result_cache().get(db_config, "killboard_top", (count,), load, ttl, stale_ttl)
@@ -0,0 +1,198 @@
+import logging
+import time
+import aiomysql
+import discord
+from dbpool import acquire, database_label, execute, pool_key
+from killboard import ENVIRONMENT_KILLER_ID
+from outbound import PRIORITY_DASHBOARD
+from scheduler import get_scheduler
+
+# Checking for a wipe costs a MAX(ID) query, so an idle feed does it at most this often
+WIPE_CHECK_INTERVAL = 600
+
+
+# ---------------- Kill Feed ----------------
+class Kill:
+    __slots__ = ('death_id', 'killer', 'killer_guild_id', 'killer_guild', 'victim', 'victim_guild_id', 'victim_guild')
+
+    def __init__(self, death_id, killer, killer_guild_id, killer_guild, victim, victim_guild_id, victim_guild):
+        self.death_id = death_id
+        self.killer = killer
+        self.killer_guild_id = killer_guild_id
+        self.killer_guild = killer_guild
+        self.victim = victim
+        self.victim_guild_id = victim_guild_id
+        self.victim_guild = victim_guild
+
+    @property
+    def team_kill(self):
+        # By guild id, as the killboard counts them; two guilds can share a name
+        return self.killer_guild_id is not None and self.killer_guild_id == self.victim_guild_id
+
+
+def _full_name(name, lastname):
+    return f"{name} {lastname}" if lastname else name
+
+
+class KillFeed:
+    """Tails chars_deathlog for one database and hands new kills to every subscribed bot.
+
+    Each poll is one keyset query on the primary key (ID > last seen, LIMIT batch_size), so it
+    never scans or skips through old rows; killer and victim names and guilds come from
+    primary-key joins in the same query. A full batch means a fight is still producing kills,
+    so the next poll comes right away until the feed has caught up.
+    """
+
+    def __init__(self, db_config, batch_size=500, catch_up_interval=0.5):
+        self.db_config = db_config
+        self.batch_size = batch_size
+        self.catch_up_interval = catch_up_interval
+        self.poll_interval = 5
+        self.last_death_id = None
+        self.behind = False
+        self.subscribers = set()
+        self.job_name = f"killfeed:{database_label(db_config)}"
+        self._last_wipe_check = time.monotonic()
+
+    async def poll(self):
+        async with acquire(self.db_config) as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                if self.last_death_id is None or self._wipe_check_due():
+                    # Start at the newest death; kills from before the bot started are not replayed.
+                    # This poll's one query is the check; new rows are read from the next poll on.
+                    await execute(cursor, "killfeed_max_id", "SELECT MAX(ID) AS max_id FROM chars_deathlog")
+                    max_id = (await cursor.fetchone())["max_id"] or 0
+                    self._last_wipe_check = time.monotonic()
+                    if self.last_death_id is None or max_id < self.last_death_id:
+                        self.last_death_id = max_id
+                    return
+
+                await execute(cursor, "killfeed_new_deaths", """
+                    SELECT
+                        d.ID, d.CharID, d.KillerID,
+                        killer.Name AS KillerName, killer.Lastname AS KillerLastname,
+                        killer.GuildID AS KillerGuildID, killer_guild.Name AS KillerGuildName,
+                        victim.Name AS VictimName, victim.Lastname AS VictimLastname,
+                        victim.GuildID AS VictimGuildID, victim_guild.Name AS VictimGuildName
+                    FROM chars_deathlog d
+                    LEFT JOIN `character` killer ON killer.ID = d.KillerID
+                    LEFT JOIN guilds killer_guild ON killer_guild.ID = killer.GuildID
+                    LEFT JOIN `character` victim ON victim.ID = d.CharID
+                    LEFT JOIN guilds victim_guild ON victim_guild.ID = victim.GuildID
+                    WHERE d.ID > %s
+                    ORDER BY d.ID
+                    LIMIT %s
+                """, (self.last_death_id, self.batch_size))
+                rows = await cursor.fetchall()
+                self.behind = len(rows) >= self.batch_size
+                if not rows:
+                    return
+                self.last_death_id = rows[-1]["ID"]
+                self._last_wipe_check = time.monotonic()
+
+        kills = []
+        for row in rows:
+            # As on the killboard: environment deaths and deaths of unknown characters are skipped
+            if row["KillerID"] == ENVIRONMENT_KILLER_ID or row["KillerName"] is None or row["VictimName"] is None:
+                continue
+            kills.append(Kill(
+                row["ID"],
+                _full_name(row["KillerName"], row["KillerLastname"]), row["KillerGuildID"], row["KillerGuildName"],
+                _full_name(row["VictimName"], row["VictimLastname"]), row["VictimGuildID"], row["VictimGuildName"]
+            ))
+        if kills:
+            for callback in list(self.subscribers):
+                callback(kills)
+
+    def _wipe_check_due(self):
+        # Only while idle: a wipe restarts IDs below the mark, so no new rows would ever show up
+        return time.monotonic() - self._last_wipe_check >= WIPE_CHECK_INTERVAL
+
+    def next_interval(self):
+        return self.catch_up_interval if self.behind else self.poll_interval
+
+    def subscribe(self, callback, poll_interval):
+        """Call callback(kills) with every batch of new kills; the feed polls as often as its most eager subscriber."""
+        self.poll_interval = min(poll_interval, self.poll_interval) if self.subscribers else poll_interval
+        self.subscribers.add(callback)
+        scheduler = get_scheduler()
+        if not scheduler.has(self.job_name):
+            scheduler.add(
+                self.job_name, self.poll, self.next_interval, jitter=0,
+                backoff_group=f"db:{database_label(self.db_config)}"
+            )
+
+    def unsubscribe(self, callback):
+        self.subscribers.discard(callback)
+        if not self.subscribers:
+            get_scheduler().remove(self.job_name)
+
+
+_feeds = {}
+
+
+def get_kill_feed(db_config):
+    """Return the process-wide kill feed for a database, shared by every bot that posts it."""
+    key = pool_key(db_config)
+    if key not in _feeds:
+        _feeds[key] = KillFeed(db_config)
+    return _feeds[key]
+
+
+# ---------------- Discord Output ----------------
+class KillFeedChannel:
+    """Buffers kills for one bot's feed channel and posts them as one embed per flush window.
+
+    Only the newest `max_lines` kills are kept, since that is all an embed shows; older ones are
+    just counted. A channel that keeps failing therefore can't grow the buffer without limit.
+    """
+
+    def __init__(self, channel, outbound, bot_name, max_lines=40):
+        self.channel = channel
+        self.outbound = outbound
+        self.bot_name = bot_name
+        self.max_lines = max_lines
+        self.pending = []
+        self.dropped = 0
+
+    def add(self, kills):
+        self.pending.extend(kills)
+        if len(self.pending) > self.max_lines:
+            self.dropped += len(self.pending) - self.max_lines
+            del self.pending[:-self.max_lines]
+
+    def embed(self, kills, dropped=0):
+        lines = []
+        length = 0
+        for kill in kills:
+            killer = f"**{kill.killer}**" + (f" [{kill.killer_guild}]" if kill.killer_guild else "")
+            victim = f"**{kill.victim}**" + (f" [{kill.victim_guild}]" if kill.victim_guild else "")
+            line = f"🗡️ {killer} killed {victim}" + (" (team kill)" if kill.team_kill else "")
+            # Embed descriptions hold 4096 characters; leave room for the overflow note
+            if length + len(line) + 1 > 4000:
+                break
+            lines.append(line)
+            length += len(line) + 1
+        total = len(kills) + dropped
+        embed = discord.Embed(title=f"{self.bot_name} Kill Feed", description="\n".join(lines), color=discord.Color.red())
+        if total > len(lines):
+            embed.description += f"\n…and {total - len(lines)} more"
+        embed.set_footer(text=f"{total} kill{'s' if total != 1 else ''}")
+        embed.timestamp = discord.utils.utcnow()
+        return embed
+
+    async def flush(self):
+        if not self.pending:
+            return
+        kills, dropped = self.pending, self.dropped
+        self.pending, self.dropped = [], 0
+        embed = self.embed(kills, dropped)
+        try:
+            await self.outbound.submit(lambda: self.channel.send(embed=embed), self.channel.id, PRIORITY_DASHBOARD, kind="send")
+        except Exception:
+            # Retry in the next window, still within the max_lines bound
+            newer, self.pending = self.pending, kills
+            self.dropped += dropped
+            self.add(newer)
+            raise
+        logging.info(f"{self.bot_name} | Posted {len(kills) + dropped} kills to the kill feed.")
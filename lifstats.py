@@ -1,173 +1,278 @@
 import discord
 import logging
 import aiomysql
-import asyncio
-
-async def fetch_guild_wealth_data(bot_config, bot_name):
-    """Fetch guild wealth data from the database with additional details."""
-    results = []
-    try:
-        async with aiomysql.connect(
-            host=bot_config['database']['database_address'],
-            port=int(bot_config['database']['database_port']),
-            user=bot_config['database']['database_user'],
-            password=bot_config['database']['database_password'],
-            db=bot_config['database']['database_name'],
-            autocommit=True
-        ) as connection:
+import time
+from dbpool import acquire, database_label, execute, pool_key
+from resultcache import get_result_cache
+from scheduler import get_scheduler
+
+# Each wealth source is aggregated on its own so every join can use an index and no
+# per-guild row fans out against another source before it is summed.
+GUILD_QUERIES = {
+    "guilds": "SELECT ID, Name FROM guilds",
+    "members": """
+        SELECT GuildID, COUNT(DISTINCT AccountID) AS TotalMembers, COUNT(*) AS TotalCharacters
+        FROM `character`
+        WHERE GuildID IS NOT NULL
+        GROUP BY GuildID
+    """,
+    "outposts": """
+        SELECT OwnerGuildID AS GuildID, COUNT(*) AS TotalOutposts
+        FROM outposts
+        GROUP BY OwnerGuildID
+    """,
+    # Inventory and equipment are separate joins rather than one OR join, so both hit items.ContainerID
+    "movable": """
+        SELECT held.GuildID, SUM(ot.BasePrice) AS TotalWealth
+        FROM (
+            SELECT c.GuildID, i.ObjectTypeID
+            FROM `character` c
+            JOIN items i ON i.ContainerID = c.RootContainerID
+            WHERE c.GuildID IS NOT NULL
+            UNION ALL
+            SELECT c.GuildID, i.ObjectTypeID
+            FROM `character` c
+            JOIN items i ON i.ContainerID = c.EquipmentContainerID
+            WHERE c.GuildID IS NOT NULL
+        ) AS held
+        JOIN objects_types ot ON ot.ID = held.ObjectTypeID
+        GROUP BY held.GuildID
+    """,
+    "unmovable": """
+        SELECT gl.GuildID, SUM(ot.BasePrice) AS TotalWealth
+        FROM unmovable_objects_claims uoc
+        JOIN unmovable_objects uo ON uo.ID = uoc.UnmovableObjectID
+        JOIN guild_lands gl ON gl.ID = uoc.ClaimID
+        JOIN items i ON i.ContainerID = uo.RootContainerID
+        JOIN objects_types ot ON ot.ID = i.ObjectTypeID
+        GROUP BY gl.GuildID
+    """,
+}
+
+
+class GuildNameTrie:
+    """Prefix trie over guild names, case-insensitive, matching the start of any word in a name.
+
+    Every node keeps the ranks of the best `keep` guilds below it, in rank order, so a prefix
+    lookup costs one step per typed character however many guilds share the prefix.
+    """
+
+    __slots__ = ('children', 'ranks', 'exact')
+
+    def __init__(self):
+        self.children = {}
+        self.ranks = []
+        self.exact = []
+
+    def insert(self, name, rank, keep=10):
+        """Insert names in rank order so each node's ranks stay sorted."""
+        words = name.casefold().split()
+        for start in range(len(words)):
+            node = self
+            for char in " ".join(words[start:]):
+                node = node.children.setdefault(char, GuildNameTrie())
+                if len(node.ranks) < keep and (not node.ranks or node.ranks[-1] != rank):
+                    node.ranks.append(rank)
+            if start == 0:
+                node.exact.append(rank)
+
+    def find(self, prefix):
+        """Return (ranks of guilds named exactly prefix, ranks of the best guilds matching it)."""
+        node = self
+        for char in " ".join(prefix.casefold().split()):
+            node = node.children.get(char)
+            if node is None:
+                return [], []
+        return node.exact, node.ranks
+
+
+class GuildWealthSnapshot:
+    """Every guild's wealth, ordered richest first, as of one refresh, with a name index for lookups."""
+
+    def __init__(self, guilds, refreshed_at, duration):
+        self.guilds = guilds
+        self.refreshed_at = refreshed_at
+        self.duration = duration
+        self.names = GuildNameTrie()
+        for rank, guild in enumerate(guilds, 1):
+            if guild["guild_name"]:
+                self.names.insert(guild["guild_name"], rank)
+
+    def top(self, count=None):
+        return self.guilds if count is None else self.guilds[:count]
+
+    def page(self, page, per_page=13):
+        """Return (rank, guild) pairs for a 1-based page of the leaderboard and the number of pages."""
+        pages = max(1, -(-len(self.guilds) // per_page))
+        page = min(max(page, 1), pages)
+        start = (page - 1) * per_page
+        return list(enumerate(self.guilds[start:start + per_page], start + 1)), pages
+
+    def find(self, query, limit=5):
+        """Return up to `limit` (rank, guild) pairs for guilds with a word starting with query, exact names first."""
+        exact, ranks = self.names.find(query)
+        ordered = list(dict.fromkeys(exact + ranks))[:limit]
+        return [(rank, self.guilds[rank - 1]) for rank in ordered]
+
+
+class GuildWealthIndex:
+    """Holds the latest guild wealth snapshot for one database and refreshes it on its own schedule."""
+
+    def __init__(self):
+        self.snapshot = None
+        self.users = set()
+
+    async def _build_snapshot(self, db_config, bot_name):
+        started = time.monotonic()
+        async with acquire(db_config) as connection:
             async with connection.cursor(aiomysql.DictCursor) as cursor:
-                query = """
-                SELECT 
-    g.ID AS GuildID,
-    g.Name AS GuildName,
-    COUNT(DISTINCT c.AccountID) AS TotalMembers,
-    COUNT(DISTINCT c.ID) AS TotalCharacters,
-    COALESCE(SUM(movable.TotalWealth), 0) AS TotalGuildWealth, -- Total movable wealth
-    COUNT(DISTINCT o.ID) AS TotalOutposts,
-    COALESCE(SUM(immovable.TotalWealth), 0) AS TotalUnmovableWealth, -- Total unmovable wealth
-    COALESCE(SUM(movable.TotalWealth), 0) + COALESCE(SUM(immovable.TotalWealth), 0) AS TotalWealth -- Combined total wealth
-FROM 
-    guilds g
-LEFT JOIN 
-    `character` c ON c.GuildID = g.ID
-LEFT JOIN 
-    outposts o ON o.OwnerGuildID = g.ID
-
--- Subquery for calculating movable wealth from character items
-LEFT JOIN (
-    SELECT 
-        c.GuildID,
-        SUM(ot.BasePrice) AS TotalWealth
-    FROM 
-        items i
-    JOIN 
-        objects_types ot ON i.ObjectTypeID = ot.ID
-    JOIN 
-        `character` c ON i.ContainerID = c.RootContainerID OR i.ContainerID = c.EquipmentContainerID
-    GROUP BY 
-        c.GuildID
-) AS movable ON movable.GuildID = g.ID
-
--- Subquery for calculating unmovable wealth from unmovable objects
-LEFT JOIN (
-    SELECT 
-        gl.GuildID,
-        SUM(ot2.BasePrice) AS TotalWealth
-    FROM 
-        unmovable_objects_claims uoc
-    JOIN 
-        unmovable_objects uo ON uo.ID = uoc.UnmovableObjectID
-    JOIN 
-        guild_lands gl ON gl.ID = uoc.ClaimID
-    LEFT JOIN 
-        items i2 ON i2.ContainerID = uo.RootContainerID
-    LEFT JOIN 
-        objects_types ot2 ON i2.ObjectTypeID = ot2.ID
-    GROUP BY 
-        gl.GuildID
-) AS immovable ON immovable.GuildID = g.ID
-
--- Additionally calculate movable wealth from items directly associated with guild members
-LEFT JOIN (
-    SELECT 
-        g.ID AS GuildID,
-        SUM(ot.BasePrice) AS TotalWealth
-    FROM 
-        guilds g
-    JOIN 
-        `character` c ON c.GuildID = g.ID
-    JOIN 
-        items i ON i.ContainerID = c.RootContainerID OR i.ContainerID = c.EquipmentContainerID
-    JOIN 
-        objects_types ot ON i.ObjectTypeID = ot.ID
-    GROUP BY 
-        g.ID
-) AS guildMovable ON guildMovable.GuildID = g.ID
-
-GROUP BY 
-    g.ID, g.Name
-ORDER BY 
-    TotalWealth DESC; -- Order by the combined total wealth
-                """
-                await cursor.execute(query)
-                results = await cursor.fetchall()
-
-        logging.info(f"{bot_name} | Guild wealth data fetched successfully.")
-        return [
-            {
-                "guild_id": record["GuildID"],
-                "guild_name": record["GuildName"],
-                "total_members": record["TotalMembers"],
-                "total_characters": record["TotalCharacters"],
-                "total_guild_wealth": record["TotalGuildWealth"],
-                "total_outposts": record["TotalOutposts"],
-                "total_unmovable_wealth": record["TotalUnmovableWealth"],
-                "total_wealth": record["TotalWealth"]
-            }
-            for record in results
-        ]
-    except aiomysql.Error as db_error:
-        logging.error(f"{bot_name} | Database error: {db_error}")
-        return []
-    except Exception as e:
-        logging.error(f"{bot_name} | An unexpected error occurred: {e}")
-        return []
-
-async def periodic_guildwealth_update(channel, bot_config, message_manager, bot_name, interval):
-    """Periodically update the guild wealth data in the Discord channel with a backoff strategy."""
-    max_backoff = 300  # Maximum backoff time in seconds (5 minutes)
-    current_interval = interval
-    
-    try:
-        while True:
-            try:
-                guild_wealth_data = await fetch_guild_wealth_data(bot_config, bot_name)
-                embed = discord.Embed(title=f"{bot_name} Guild Wealth Leaderboard", color=discord.Color.gold())
-
-                # Limit to 13 entries
-                max_entries = 13
-                guild_info_lines = []
-
-                for index, record in enumerate(guild_wealth_data):
-                    if index < max_entries:
-                        line = (f"**#{index + 1}** | {record['guild_name']} | "
-                                f"🏰 **Outposts:** {record['total_outposts']} | "
-                                f"🪙 **:** {record['total_wealth']}")
-                        if len(line) <= 1024:
-                            guild_info_lines.append(line)
-                    else:
-                        break
-
-                guild_info = "\n".join(guild_info_lines)
-                if len(guild_info) > 1024:
-                    guild_info = guild_info[:1021] + "..."
-
-                embed.add_field(
-                    name="**Top Wealthy Guilds**", 
-                    value=guild_info or "No data available.", 
-                    inline=False
-                )
-
-                wealth_image = bot_config['webhooks']['guildwealth'].get('wealth_image', None)
-                if wealth_image:
-                    embed.set_image(url=wealth_image)
-
-                await message_manager.get_or_create_message(channel, embed, "guildwealth")
-                logging.info(f"{bot_name} | Guild wealth data updated successfully.")
-
-                # Reset backoff interval after successful run
-                current_interval = interval
-
-            except asyncio.CancelledError:
-                logging.info(f"{bot_name} | Guild wealth update task cancelled.")
-                break
-
-            except Exception as e:
-                logging.error(f"{bot_name} | Error during guild wealth update: {e}")
-                # Increase backoff time after failure, up to the maximum
-                current_interval = min(current_interval * 2, max_backoff)
-                logging.info(f"{bot_name} | Retrying in {current_interval} seconds after error.")
-                
-            await asyncio.sleep(current_interval)
-    finally:
-        logging.info(f"{bot_name} | Guild wealth update loop has exited.")
\ No newline at end of file
+                results = {}
+                for name, query in GUILD_QUERIES.items():
+                    await execute(cursor, f"guildwealth_{name}", query)
+                    results[name] = await cursor.fetchall()
+
+        members = {row["GuildID"]: row for row in results["members"]}
+        outposts = {row["GuildID"]: row["TotalOutposts"] for row in results["outposts"]}
+        movable = {row["GuildID"]: row["TotalWealth"] or 0 for row in results["movable"]}
+        unmovable = {row["GuildID"]: row["TotalWealth"] or 0 for row in results["unmovable"]}
+
+        guilds = []
+        for row in results["guilds"]:
+            guild_id = row["ID"]
+            guild_members = members.get(guild_id, {})
+            guilds.append({
+                "guild_id": guild_id,
+                "guild_name": row["Name"],
+                "total_members": guild_members.get("TotalMembers", 0),
+                "total_characters": guild_members.get("TotalCharacters", 0),
+                "total_guild_wealth": movable.get(guild_id, 0),
+                "total_outposts": outposts.get(guild_id, 0),
+                "total_unmovable_wealth": unmovable.get(guild_id, 0),
+                "total_wealth": movable.get(guild_id, 0) + unmovable.get(guild_id, 0)
+            })
+        guilds.sort(key=lambda guild: guild["total_wealth"], reverse=True)
+
+        duration = time.monotonic() - started
+        self.snapshot = GuildWealthSnapshot(guilds, time.time(), duration)
+        logging.info(f"{bot_name} | Guild wealth snapshot refreshed in {duration:.2f}s ({len(guilds)} guilds).")
+        return self.snapshot
+
+    async def refresh(self, db_config, bot_name, ttl=0):
+        """Rebuild the snapshot unless one is younger than `ttl`, joining a rebuild that is already running."""
+        return await get_result_cache().get(
+            db_config, "guildwealth_snapshot", (), lambda: self._build_snapshot(db_config, bot_name), ttl
+        )
+
+    async def get(self, db_config, bot_name):
+        """Return the current snapshot, building the first one if none exists yet."""
+        if self.snapshot is None:
+            return await self.refresh(db_config, bot_name)
+        return self.snapshot
+
+    def start(self, db_config, bot_name, interval):
+        """Refresh the snapshot every `interval` seconds while any bot uses it, as one scheduler job per database.
+
+        Returns the job's name. Calling it again for the same bot (e.g. after a reconnect) is harmless.
+        """
+        label = database_label(db_config)
+        job_name = f"guildwealth_snapshot:{label}"
+        self.users.add(bot_name)
+        scheduler = get_scheduler()
+        if not scheduler.has(job_name):
+            # The first render builds a snapshot on demand, so the first scheduled refresh can wait
+            scheduler.add(
+                job_name, lambda: self.refresh(db_config, label), interval,
+                backoff_group=f"db:{label}", delay=interval
+            )
+        return job_name
+
+    def stop(self, db_config, bot_name):
+        """Drop a bot's use of the snapshot; the refresh job stops once no bot uses it."""
+        self.users.discard(bot_name)
+        if not self.users:
+            get_scheduler().remove(f"guildwealth_snapshot:{database_label(db_config)}")
+
+
+_wealth_indexes = {}
+
+
+def get_guild_wealth_index(db_config):
+    """Return the process-wide guild wealth index for a database, shared by every bot that uses it."""
+    key = pool_key(db_config)
+    if key not in _wealth_indexes:
+        _wealth_indexes[key] = GuildWealthIndex()
+    return _wealth_indexes[key]
+
+
+def leaderboard_lines(ranked_guilds):
+    """Leaderboard lines for (rank, guild) pairs, fitted into one 1024-character embed field."""
+    guild_info_lines = []
+    for rank, record in ranked_guilds:
+        line = (f"**#{rank}** | {record['guild_name']} | "
+                f"🏰 **Outposts:** {record['total_outposts']} | "
+                f"🪙 **:** {record['total_wealth']}")
+        if len(line) <= 1024:
+            guild_info_lines.append(line)
+
+    guild_info = "\n".join(guild_info_lines)
+    if len(guild_info) > 1024:
+        guild_info = guild_info[:1021] + "..."
+    return guild_info
+
+
+async def update_guildwealth(channel, bot_config, message_manager, bot_name, max_entries=13):
+    """Render the richest guilds from the shared snapshot; errors propagate so the scheduler backs off."""
+    snapshot = await get_guild_wealth_index(bot_config['database']).get(bot_config['database'], bot_name)
+    embed = discord.Embed(title=f"{bot_name} Guild Wealth Leaderboard", color=discord.Color.gold())
+
+    embed.add_field(
+        name="**Top Wealthy Guilds**", 
+        value=leaderboard_lines(enumerate(snapshot.top(max_entries), 1)) or "No data available.", 
+        inline=False
+    )
+
+    wealth_image = bot_config['webhooks']['guildwealth'].get('wealth_image', None)
+    if wealth_image:
+        embed.set_image(url=wealth_image)
+
+    await message_manager.get_or_create_message(channel, embed, "guildwealth")
+    logging.info(f"{bot_name} | Guild wealth data updated successfully.")
+
+
+def guild_page_embed(snapshot, page, bot_name, per_page=13):
+    """Embed for /guilds [page]: one page of the full leaderboard from the snapshot in memory."""
+    embed = discord.Embed(title=f"{bot_name} Guild Wealth Leaderboard", color=discord.Color.gold())
+    if snapshot is None:
+        embed.description = "Guild wealth is still loading, try again in a minute."
+        return embed
+    ranked_guilds, pages = snapshot.page(page, per_page)
+    embed.add_field(name="**Wealthy Guilds**", value=leaderboard_lines(ranked_guilds) or "No data available.", inline=False)
+    page = min(max(page, 1), pages)
+    embed.set_footer(text=f"Page {page}/{pages} | /guilds <page> for more, /guild <name> for details")
+    return embed
+
+
+def guild_lookup_embed(snapshot, query, bot_name):
+    """Embed for /guild <name>: wealth breakdown and rank of the best matching guilds."""
+    embed = discord.Embed(title=f"{bot_name} Guild Lookup", color=discord.Color.gold())
+    if not query:
+        embed.description = "Usage: /guild <guild name>"
+        return embed
+    if snapshot is None:
+        embed.description = "Guild wealth is still loading, try again in a minute."
+        return embed
+    matches = snapshot.find(query, limit=3)
+    if not matches:
+        embed.description = f"No guild found matching \"{query}\"."
+        return embed
+    for rank, guild in matches:
+        embed.add_field(
+            name=f"#{rank} {guild['guild_name']}",
+            value=(f"👥 **Members:** {guild['total_members']} ({guild['total_characters']} characters)\n"
+                   f"🏰 **Outposts:** {guild['total_outposts']}\n"
+                   f"📦 **Movable:** {guild['total_guild_wealth']} | 🏠 **Unmovable:** {guild['total_unmovable_wealth']}\n"
+                   f"🪙 **Total:** {guild['total_wealth']}"),
+            inline=False
+        )
+    embed.set_footer(text=f"Ranked out of {len(snapshot.guilds)} guilds")
+    return embed
@@ -0,0 +1,131 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from metrics import DISCORD_RATE_LIMITED
+from outbound import TokenBucket
+
+# The bot a log line belongs to. Set once per bot task; every task it spawns inherits it.
+BOT_NAME = contextvars.ContextVar('bot_name', default='-')
+
+# Logger for lines written once per chat message; sampled so busy guilds can't flood the log
+MESSAGE_LOGGER = 'chatbot.messages'
+# discord.py retries 429s itself and only reports them in this logger
+DISCORD_HTTP_LOGGER = 'discord.http'
+RATE_LIMIT_KINDS = {'POST': 'send', 'PATCH': 'edit', 'PUT': 'edit', 'DELETE': 'delete'}
+
+TEXT_FORMAT = '%(asctime)s - %(bot_name)s - %(levelname)s - %(message)s'
+
+_listener = None
+
+
+class BotContextFilter(logging.Filter):
+    """Tag records with the bot whose task logged them."""
+
+    def filter(self, record):
+        record.bot_name = BOT_NAME.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Let through at most `rate` records a second per bot (with bursts of `burst`) and count the rest.
+
+    The next record that gets through notes how many were dropped in between.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rate=5, burst=20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.suppressed = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        bot_name = BOT_NAME.get()
+        bucket = self.buckets.get(bot_name)
+        if bucket is None:
+            bucket = self.buckets[bot_name] = TokenBucket(self.rate, self.burst)
+        now = time.monotonic()
+        if bucket.delay(now):
+            self.suppressed[bot_name] = self.suppressed.get(bot_name, 0) + 1
+            return False
+        bucket.take(now)
+        suppressed = self.suppressed.pop(bot_name, 0)
+        if suppressed and isinstance(record.msg, str):
+            record.msg = f"{record.msg} [{suppressed} similar lines suppressed]"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "bot": getattr(record, 'bot_name', '-'),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitCounter(logging.Filter):
+    """Count the 429s discord.py handles internally, which never reach our own code as exceptions."""
+
+    def filter(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith("We are being rate limited.") and record.args:
+            kind = RATE_LIMIT_KINDS.get(str(record.args[0]), str(record.args[0]).lower())
+            DISCORD_RATE_LIMITED.inc(bot=BOT_NAME.get(), kind=kind)
+        return True
+
+
+def setup_logging(level="INFO", json_output=False, message_log_rate=5, message_log_burst=20):
+    """Route all logging through a queue so the event loop never waits on stdout.
+
+    Records are tagged and queued on the calling thread; a QueueListener thread formats
+    and writes them. Safe to call again to change the settings.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_output else logging.Formatter(TEXT_FORMAT))
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(BotContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    message_logger = logging.getLogger(MESSAGE_LOGGER)
+    for existing in list(message_logger.filters):
+        message_logger.removeFilter(existing)
+    message_logger.addFilter(SamplingFilter(message_log_rate, message_log_burst))
+
+    http_logger = logging.getLogger(DISCORD_HTTP_LOGGER)
+    for existing in list(http_logger.filters):
+        http_logger.removeFilter(existing)
+    http_logger.addFilter(RateLimitCounter())
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _flush_logs():
+    if _listener is not None:
+        _listener.stop()
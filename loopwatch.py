@@ -0,0 +1,198 @@
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from metrics import LOOP_LAG_SECONDS, SLOW_CALLBACKS
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}.{code.co_qualname}"
+
+
+def _stack(frame):
+    """Frames from outermost to innermost."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def blocking_callback(frame):
+    """Name the callback the event loop thread is running, e.g. the coroutine of the task it is stepping."""
+    stack = _stack(frame)
+    # Everything above the loop's Handle._run is the loop itself; the first non-asyncio frame below it is the callback
+    start = 0
+    for position, candidate in enumerate(stack):
+        if candidate.f_globals.get('__name__') == 'asyncio.events':
+            start = position + 1
+    for candidate in stack[start:]:
+        if not candidate.f_globals.get('__name__', '').startswith('asyncio'):
+            return _frame_name(candidate)
+    return _frame_name(frame)
+
+
+# ---------------- Loop Lag Watchdog ----------------
+class LoopWatchdog:
+    """Measures event loop lag and reports callbacks that block it.
+
+    A heartbeat task on the loop stamps the time every `interval` seconds. A daemon thread
+    checks the stamp; if the loop hasn't come back for `threshold` seconds, whatever the loop
+    thread is running right now is the culprit, so its stack is logged and counted once per stall.
+    """
+
+    def __init__(self, threshold=0.25, interval=0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self.slow_callbacks = collections.Counter()
+        self.max_lag = 0.0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._heartbeat_task = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            started = time.monotonic()
+            self._last_beat = started
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG_SECONDS.observe(lag)
+
+    def _monitor(self):
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or beat == reported_beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported_beat = beat
+            name = blocking_callback(frame)
+            self.slow_callbacks[name] += 1
+            SLOW_CALLBACKS.inc(callback=name)
+            logging.warning(
+                f"Event loop blocked for {stalled:.3f}s in {name}:\n" + "".join(traceback.format_stack(frame))
+            )
+
+    def start(self):
+        if self._heartbeat_task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat_task = asyncio.ensure_future(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logging.info(f"Event loop watchdog started (threshold {self.threshold}s)")
+
+    def stop(self):
+        self._stopped.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    def summary(self, count=10):
+        return self.slow_callbacks.most_common(count)
+
+
+_watchdog = None
+
+
+def get_watchdog(threshold=0.25):
+    """Return the process-wide watchdog, creating it on first use."""
+    global _watchdog
+    if _watchdog is None:
+        _watchdog = LoopWatchdog(threshold)
+    return _watchdog
+
+
+# ---------------- Sampling Profiler ----------------
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed rate and aggregates where the time goes.
+
+    Runs on its own thread so the event loop keeps working while it is being profiled.
+    Samples taken while the loop waits in select() are counted as idle.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self.self_counts = collections.Counter()
+        self.total_counts = collections.Counter()
+        self.stacks = collections.Counter()
+
+    def _is_idle(self, frame):
+        return frame.f_code.co_name in ("select", "poll") and frame.f_globals.get('__name__') == 'selectors'
+
+    def sample(self, duration):
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples += 1
+                if self._is_idle(frame):
+                    self.idle += 1
+                else:
+                    names = [_frame_name(candidate) for candidate in _stack(frame)]
+                    self.self_counts[names[-1]] += 1
+                    for name in set(names):
+                        self.total_counts[name] += 1
+                    self.stacks[";".join(names)] += 1
+            time.sleep(self.interval)
+
+    def report(self, duration, count=25):
+        busy = self.samples - self.idle
+        lines = [
+            f"Sampling profile: {duration}s at {self.interval * 1000:.0f}ms, {self.samples} samples, "
+            f"{busy} busy ({(busy / self.samples * 100) if self.samples else 0:.1f}%), {self.idle} idle",
+            "",
+            "Top functions by own time (samples, % of busy):",
+        ]
+        for name, samples in self.self_counts.most_common(count):
+            lines.append(f"  {samples:6d} {samples / busy * 100:5.1f}%  {name}")
+        lines += ["", "Top functions including callees (samples, % of busy):"]
+        for name, samples in self.total_counts.most_common(count):
+            lines.append(f"  {samples:6d} {samples / busy * 100:5.1f}%  {name}")
+        # Collapsed stacks, one per line, as flamegraph.pl and speedscope read them
+        lines += ["", "Collapsed stacks:"]
+        for stack, samples in self.stacks.most_common():
+            lines.append(f"{stack} {samples}")
+        return "\n".join(lines) + "\n"
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile_event_loop(duration, output_dir=os.path.join('data', 'profiles'), interval=0.005):
+    """Profile the running event loop's thread for `duration` seconds and write the report to disk.
+
+    Returns (path, profiler). Only one profile runs at a time; a second call waits its turn.
+    """
+    async with _profile_lock:
+        profiler = SamplingProfiler(threading.get_ident(), interval)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, profiler.sample, duration)
+        report = profiler.report(duration)
+        path = os.path.join(output_dir, time.strftime("profile-%Y%m%d-%H%M%S.txt"))
+
+        def write():
+            os.makedirs(output_dir, exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(report)
+
+        await loop.run_in_executor(None, write)
+        logging.info(f"Wrote {duration}s event loop profile to {path}")
+        return path, profiler
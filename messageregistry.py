@@ -0,0 +1,62 @@
+import logging
+import os
+import sqlite3
+
+
+# ---------------- Message Registry ----------------
+class MessageRegistry:
+    """Remembers which Discord message each dashboard lives in, so a restart can edit it in place."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS dashboard_messages (
+                bot_name TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                channel_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                PRIMARY KEY (bot_name, cache_key)
+            )
+        """)
+        self.connection.commit()
+
+    def load(self, bot_name):
+        """Return {cache_key: (channel_id, message_id)} for one bot."""
+        rows = self.connection.execute(
+            "SELECT cache_key, channel_id, message_id FROM dashboard_messages WHERE bot_name = ?", (bot_name,)
+        )
+        return {cache_key: (channel_id, message_id) for cache_key, channel_id, message_id in rows}
+
+    def save(self, bot_name, cache_key, channel_id, message_id):
+        try:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO dashboard_messages (bot_name, cache_key, channel_id, message_id) VALUES (?, ?, ?, ?)",
+                (bot_name, cache_key, channel_id, message_id)
+            )
+            self.connection.commit()
+        except sqlite3.Error as e:
+            logging.error(f"{bot_name} | Failed to record message for {cache_key}: {e}")
+
+    def remove(self, bot_name, cache_key):
+        try:
+            self.connection.execute(
+                "DELETE FROM dashboard_messages WHERE bot_name = ? AND cache_key = ?", (bot_name, cache_key)
+            )
+            self.connection.commit()
+        except sqlite3.Error as e:
+            logging.error(f"{bot_name} | Failed to forget message for {cache_key}: {e}")
+
+
+_registries = {}
+
+
+def get_message_registry(path):
+    """Return the process-wide registry stored at path, shared by every bot that uses it."""
+    path = os.path.abspath(path)
+    if path not in _registries:
+        _registries[path] = MessageRegistry(path)
+    return _registries[path]
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+# ---------------- Metric Types ----------------
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][position] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, (bucket_counts, total, count) in sorted(self.values.items()):
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+# ---------------- Registry ----------------
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+A2S_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "a2s_query_seconds", "A2S_INFO query latency per game server.", ("server",)))
+A2S_QUERY_TIMEOUTS = REGISTRY.register(Counter(
+    "a2s_query_timeouts_total", "A2S_INFO queries that hit their deadline.", ("server",)))
+A2S_QUERY_ERRORS = REGISTRY.register(Counter(
+    "a2s_query_errors_total", "A2S_INFO queries that failed for any other reason.", ("server",)))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "db_query_seconds", "Game database query duration per query.", ("query",)))
+DB_QUERY_ERRORS = REGISTRY.register(Counter(
+    "db_query_errors_total", "Game database queries that raised.", ("query",)))
+DB_QUERY_TIMEOUTS = REGISTRY.register(Counter(
+    "db_query_timeouts_total", "Game database queries killed at their deadline.", ("query",)))
+DB_CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "db_circuit_state", "Game database circuit breaker: 0 closed, 1 half-open, 2 open.", ("database",)))
+DISCORD_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "discord_request_seconds", "Discord API send/edit/delete latency.", ("bot", "kind")))
+DISCORD_RATE_LIMITED = REGISTRY.register(Counter(
+    "discord_rate_limited_total", "Discord API responses with HTTP 429, including those discord.py retried itself.", ("bot", "kind")))
+DISCORD_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "discord_queue_depth", "Discord writes waiting in the outbound queue.", ("bot",)))
+DISCORD_QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "discord_queue_wait_seconds", "Time Discord writes spent queued before running.", ("bot", "kind")))
+RESULT_CACHE_REQUESTS = REGISTRY.register(Counter(
+    "result_cache_requests_total", "Cached database results asked for, by outcome (hit, stale, miss, coalesced, circuit_open).", ("query", "result")))
+RESULT_CACHE_ENTRIES = REGISTRY.register(Gauge(
+    "result_cache_entries", "Database results held in the result cache."))
+CHATBOT_MATCH_SECONDS = REGISTRY.register(Histogram(
+    "chatbot_match_seconds", "Time to match one chat message against the responses.",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)))
+LOOP_DRIFT_SECONDS = REGISTRY.register(Gauge(
+    "loop_drift_seconds", "How much later than planned a scheduled job last started.", ("loop",)))
+
+LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer that was due."))
+SLOW_CALLBACKS = REGISTRY.register(Counter(
+    "event_loop_slow_callbacks_total", "Callbacks that blocked the event loop past the watchdog threshold.", ("callback",)))
+
+
+# ---------------- HTTP Endpoint ----------------
+async def _handle_request(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # Drain the headers; nothing in them matters here
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode(errors='replace').split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split('?')[0] == "/metrics":
+            body = REGISTRY.render().encode()
+            status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, status, content_type = b"Not Found\n", "404 Not Found", "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host='127.0.0.1', port=9108):
+    """Serve the registry in Prometheus text format at http://host:port/metrics."""
+    server = await asyncio.start_server(_handle_request, host, port)
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
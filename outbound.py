@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+import discord
+from metrics import DISCORD_QUEUE_DEPTH, DISCORD_QUEUE_WAIT_SECONDS, DISCORD_RATE_LIMITED, DISCORD_REQUEST_SECONDS
+
+# Lower numbers go first
+PRIORITY_CHAT = 0
+PRIORITY_DASHBOARD = 1
+PRIORITY_CLEANUP = 2
+
+
+# ---------------- Token Bucket ----------------
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+# ---------------- Outbound Scheduler ----------------
+class OutboundJob:
+    __slots__ = ('priority', 'sequence', 'channel_id', 'factory', 'future', 'coalesce_key', 'kind', 'enqueued_at')
+
+    def __init__(self, priority, sequence, channel_id, factory, future, coalesce_key, kind):
+        self.priority = priority
+        self.sequence = sequence
+        self.channel_id = channel_id
+        self.factory = factory
+        self.future = future
+        self.coalesce_key = coalesce_key
+        self.kind = kind
+        self.enqueued_at = time.monotonic()
+
+
+class DiscordWriteScheduler:
+    """Central queue for one bot's Discord sends, edits and deletes.
+
+    Jobs run in priority order through a global and a per-channel token bucket, on a few workers
+    so one slow request doesn't hold up the rest. A job submitted with a coalesce_key replaces
+    any queued job with the same key, so only the newest pending edit of a message is sent.
+    """
+
+    def __init__(self, name="bot", global_rate=45, global_burst=45, channel_rate=1, channel_burst=5, workers=4):
+        self.name = name
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.channel_buckets = {}
+        self.worker_count = workers
+        self._pending = []
+        self._coalesced = {}
+        self._sequence = 0
+        self._wakeup = asyncio.Event()
+        self._workers = []
+        self.metrics = {
+            "submitted": 0,
+            "coalesced": 0,
+            "completed": 0,
+            "failed": 0,
+            "rate_limited": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    def _channel_bucket(self, channel_id):
+        bucket = self.channel_buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.channel_buckets[channel_id] = TokenBucket(self.channel_rate, self.channel_burst)
+        return bucket
+
+    def submit(self, factory, channel_id=None, priority=PRIORITY_DASHBOARD, coalesce_key=None, kind="send"):
+        """Queue factory() (a coroutine function) and return a future for its result.
+
+        kind only labels the request in metrics (send, edit or delete).
+        """
+        self.metrics["submitted"] += 1
+        if coalesce_key is not None and coalesce_key in self._coalesced:
+            job = self._coalesced[coalesce_key]
+            job.factory = factory
+            self.metrics["coalesced"] += 1
+            return job.future
+
+        self._sequence += 1
+        job = OutboundJob(priority, self._sequence, channel_id, factory, asyncio.get_running_loop().create_future(), coalesce_key, kind)
+        self._pending.append(job)
+        DISCORD_QUEUE_DEPTH.set(len(self._pending), bot=self.name)
+        if coalesce_key is not None:
+            self._coalesced[coalesce_key] = job
+        self._wakeup.set()
+        self.start()
+        return job.future
+
+    def _pop_ready(self, now):
+        """Take the best queued job whose channel has a token, or return the shortest wait."""
+        wait = None
+        for job in sorted(self._pending, key=lambda job: (job.priority, job.sequence)):
+            delay = self._channel_bucket(job.channel_id).delay(now) if job.channel_id is not None else 0
+            if delay == 0:
+                self._pending.remove(job)
+                DISCORD_QUEUE_DEPTH.set(len(self._pending), bot=self.name)
+                if job.coalesce_key is not None:
+                    self._coalesced.pop(job.coalesce_key, None)
+                if job.channel_id is not None:
+                    self.channel_buckets[job.channel_id].take(now)
+                return job, None
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _next_job(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            global_delay = self.global_bucket.delay(now)
+            if global_delay:
+                await asyncio.sleep(global_delay)
+                continue
+
+            job, wait = self._pop_ready(now)
+            if job is not None:
+                self.global_bucket.take(now)
+                return job
+
+            # Every queued job is waiting on its channel; sleep until the first frees up or new work arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            job = await self._next_job()
+            if job.future.cancelled():
+                continue
+            waited = time.monotonic() - job.enqueued_at
+            self.metrics["wait_seconds_total"] += waited
+            self.metrics["wait_seconds_max"] = max(self.metrics["wait_seconds_max"], waited)
+            DISCORD_QUEUE_WAIT_SECONDS.observe(waited, bot=self.name, kind=job.kind)
+            started = time.perf_counter()
+            try:
+                result = await job.factory()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                self.metrics["failed"] += 1
+                if isinstance(e, discord.HTTPException) and e.status == 429:
+                    self.metrics["rate_limited"] += 1
+                    DISCORD_RATE_LIMITED.inc(bot=self.name, kind=job.kind)
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - started, bot=self.name, kind=job.kind)
+                self.metrics["completed"] += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+
+    def start(self):
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.worker_count:
+            self._workers.append(asyncio.ensure_future(self._worker()))
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job in self._pending:
+            job.future.cancel()
+        self._pending.clear()
+        self._coalesced.clear()
+        logging.info(f"Outbound scheduler closed: {self.metrics}")
@@ -0,0 +1,183 @@
+import logging
+import mmap
+import os
+import struct
+import time
+
+# (name, seconds per bucket, buckets kept): a week of minutes, 90 days of hours, two years of days
+TIERS = (
+    ("minute", 60, 7 * 24 * 60),
+    ("hour", 3600, 90 * 24),
+    ("day", 86400, 730),
+)
+# Each tier is stored column by column so every column can be viewed as a flat typed array
+COLUMNS = (("bucket", "q"), ("count", "I"), ("min", "H"), ("max", "H"), ("sum", "I"))
+MAGIC = b"POP1"
+HEADER = struct.Struct("<4s" + "I" * len(TIERS))
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+# ---------------- Rollup Tier ----------------
+class RollupTier:
+    """A time-indexed ring of min/avg/max buckets over memory-mapped columns.
+
+    A bucket's slot is its index modulo the capacity, so no head pointer is needed: a slot
+    whose stored bucket index isn't the one asked for is stale and is reset or skipped.
+    """
+
+    def __init__(self, name, resolution, capacity, buffer, offset):
+        self.name = name
+        self.resolution = resolution
+        self.capacity = capacity
+        self.columns = {}
+        for column, typecode in COLUMNS:
+            size = struct.calcsize(typecode) * capacity
+            self.columns[column] = buffer[offset:offset + size].cast(typecode)
+            offset += size
+        self.end = offset
+
+    @staticmethod
+    def size(capacity):
+        return sum(struct.calcsize(typecode) for _, typecode in COLUMNS) * capacity
+
+    def record(self, timestamp, players):
+        bucket = int(timestamp // self.resolution)
+        slot = bucket % self.capacity
+        columns = self.columns
+        if columns["bucket"][slot] != bucket:
+            columns["bucket"][slot] = bucket
+            columns["count"][slot] = 0
+            columns["min"][slot] = players
+            columns["max"][slot] = players
+            columns["sum"][slot] = 0
+        columns["count"][slot] += 1
+        columns["sum"][slot] += players
+        columns["min"][slot] = min(columns["min"][slot], players)
+        columns["max"][slot] = max(columns["max"][slot], players)
+
+    def buckets(self, start, end):
+        """Yield (bucket start time, samples, min, avg, max) for the buckets between two timestamps."""
+        first = max(int(start // self.resolution), int(end // self.resolution) - self.capacity + 1)
+        columns = self.columns
+        for bucket in range(first, int(end // self.resolution) + 1):
+            slot = bucket % self.capacity
+            if columns["bucket"][slot] == bucket and columns["count"][slot]:
+                count = columns["count"][slot]
+                yield bucket * self.resolution, count, columns["min"][slot], columns["sum"][slot] / count, columns["max"][slot]
+
+    def release(self):
+        for view in self.columns.values():
+            view.release()
+
+
+# ---------------- Population History ----------------
+class PopulationHistory:
+    """Player counts for one game server, rolled up into minute, hour and day buckets as they arrive.
+
+    Everything lives in one fixed-size memory-mapped file (about 260 KB), so history survives
+    restarts and memory stays the same however long the bot runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._last_snapshot = None
+        capacities = [capacity for _, _, capacity in TIERS]
+        size = HEADER.size + sum(RollupTier.size(capacity) for capacity in capacities)
+        header = HEADER.pack(MAGIC, *capacities)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fresh = not os.path.exists(path) or os.path.getsize(path) != size
+        if not fresh:
+            with open(path, 'rb') as f:
+                fresh = f.read(HEADER.size) != header
+            if fresh:
+                logging.warning(f"Population history {path} has a different layout, starting a new one")
+        self._file = open(path, 'w+b' if fresh else 'r+b')
+        if fresh:
+            self._file.truncate(size)
+            self._file.write(header)
+            self._file.flush()
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._buffer = memoryview(self._mmap)
+
+        offset = HEADER.size
+        self.tiers = {}
+        for name, resolution, capacity in TIERS:
+            tier = RollupTier(name, resolution, capacity, self._buffer, offset)
+            self.tiers[name] = tier
+            offset = tier.end
+
+    def record_count(self, players, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        players = max(0, min(int(players), 0xFFFF))
+        for tier in self.tiers.values():
+            tier.record(timestamp, players)
+
+    async def record(self, snapshot):
+        """Poller subscriber; bots sharing a server each subscribe, but a snapshot is only counted once."""
+        if snapshot is self._last_snapshot or not snapshot.online:
+            return
+        self._last_snapshot = snapshot
+        self.record_count(snapshot.player_count, snapshot.timestamp)
+
+    def summary(self, seconds=86400, now=None):
+        """Return (peak, average) players over the last `seconds`, or None with no samples."""
+        now = time.time() if now is None else now
+        minute = self.tiers["minute"]
+        tier = minute if seconds <= minute.resolution * minute.capacity else self.tiers["hour"]
+        samples = total = peak = 0
+        for _, count, _, average, maximum in tier.buckets(now - seconds, now):
+            samples += count
+            total += average * count
+            peak = max(peak, maximum)
+        if not samples:
+            return None
+        return peak, total / samples
+
+    def busiest(self, days=30, now=None):
+        """Average players by local hour of day and by weekday over the last `days`, busiest first.
+
+        Returns (hours, weekdays) as lists of (label, average players), or None with no samples.
+        """
+        now = time.time() if now is None else now
+        by_hour = {}
+        by_weekday = {}
+        for start, count, _, average, _ in self.tiers["hour"].buckets(now - days * 86400, now):
+            local = time.localtime(start)
+            for groups, key in ((by_hour, local.tm_hour), (by_weekday, local.tm_wday)):
+                total, samples = groups.get(key, (0.0, 0))
+                groups[key] = (total + average * count, samples + count)
+        if not by_hour:
+            return None
+        hours = sorted(
+            ((f"{hour:02d}:00", total / samples) for hour, (total, samples) in by_hour.items()),
+            key=lambda entry: entry[1], reverse=True
+        )
+        weekdays = sorted(
+            ((WEEKDAYS[day], total / samples) for day, (total, samples) in by_weekday.items()),
+            key=lambda entry: entry[1], reverse=True
+        )
+        return hours, weekdays
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        for tier in self.tiers.values():
+            tier.release()
+        self._buffer.release()
+        self._mmap.close()
+        self._file.close()
+
+
+_histories = {}
+
+
+def get_population_history(ip, port, directory=os.path.join('data', 'population')):
+    """Return the process-wide population history for a game server, opening its file on first use."""
+    key = (ip, int(port))
+    if key not in _histories:
+        _histories[key] = PopulationHistory(os.path.join(directory, f"{ip}_{int(port)}.bin"))
+    return _histories[key]
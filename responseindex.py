@@ -0,0 +1,106 @@
+import logging
+import re
+
+# Characters that make a pattern segment more than a plain literal
+_REGEX_METACHARACTERS = set('.^$*+?{}[]|()')
+
+
+def required_literals(pattern):
+    """Return the lowercase literal pieces of a `.*`-joined pattern, or None if it uses any other regex syntax.
+
+    Every piece must appear in a message for the pattern to match, so the pieces make a cheap
+    substring prefilter. Patterns that can't be reduced this way are always regex-checked.
+    """
+    literals = []
+    for segment in pattern.split('.*'):
+        literal = []
+        chars = iter(segment)
+        for char in chars:
+            if char == '\\':
+                escaped = next(chars, None)
+                if escaped is None or escaped.isalnum():
+                    return None  # Character classes like \d or \b, or a dangling escape
+                literal.append(escaped)
+            elif char in _REGEX_METACHARACTERS:
+                return None
+            else:
+                literal.append(char)
+        text = ''.join(literal).lower()
+        if not text.isascii():
+            return None  # Case-insensitive matching of non-ASCII text is not a plain lower() comparison
+        if text:
+            literals.append(text)
+    return literals
+
+
+def validate_responses(responses):
+    """Raise ValueError if a parsed responses file isn't a list of intents with compilable patterns."""
+    if not isinstance(responses, list):
+        raise ValueError(f"expected a list of intents, got {type(responses).__name__}")
+    for position, item in enumerate(responses):
+        if not (isinstance(item, dict) and 'intent' in item and 'responses' in item):
+            raise ValueError(f"entry {position} needs 'intent' and 'responses' keys")
+        if not isinstance(item['responses'], list) or not isinstance(item.get("regex", []), list):
+            raise ValueError(f"intent {item['intent']!r}: 'responses' and 'regex' must be lists")
+        samples = item.get("samples", [])
+        if not isinstance(samples, list) or not all(isinstance(sample, str) for sample in samples):
+            raise ValueError(f"intent {item['intent']!r}: 'samples' must be a list of strings")
+        for pattern in item.get("regex", []):
+            try:
+                re.compile(pattern, re.IGNORECASE)
+            except (re.error, TypeError) as e:
+                raise ValueError(f"intent {item['intent']!r}: invalid pattern {pattern!r}: {e}")
+
+
+class ResponseIndex:
+    """Precompiled regex patterns from a responses list, with a keyword prefilter in front of them.
+
+    match() returns the same intent and pattern the plain in-order scan over every pattern would.
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.entries = []
+        self.keyword_buckets = {}
+        self.unfiltered = []
+
+        for item in responses if isinstance(responses, list) else []:
+            if not (isinstance(item, dict) and 'intent' in item and 'responses' in item):
+                continue
+            for pattern in item.get("regex", []):
+                try:
+                    compiled = re.compile(pattern, re.IGNORECASE)
+                except (re.error, TypeError) as e:
+                    logging.error(f"Skipping invalid pattern {pattern!r} for intent {item['intent']}: {e}")
+                    continue
+
+                ordinal = len(self.entries)
+                literals = required_literals(pattern)
+                self.entries.append((item, pattern, compiled, literals))
+                if literals:
+                    # Bucket under the longest piece, the one least likely to appear by chance
+                    self.keyword_buckets.setdefault(max(literals, key=len), []).append(ordinal)
+                else:
+                    self.unfiltered.append(ordinal)
+
+    def candidates(self, text):
+        """Return the entry ordinals worth regex-checking for text, in file order."""
+        if not text.isascii():
+            return range(len(self.entries))
+        ordinals = list(self.unfiltered)
+        for keyword, bucket in self.keyword_buckets.items():
+            if keyword in text:
+                ordinals.extend(bucket)
+        ordinals.sort()
+        return ordinals
+
+    def match(self, text):
+        """Return (intent item, pattern) for the first pattern that matches lowercased text, or None."""
+        prefilter = text.isascii()
+        for ordinal in self.candidates(text):
+            item, pattern, compiled, literals = self.entries[ordinal]
+            if prefilter and literals and not all(literal in text for literal in literals):
+                continue
+            if compiled.search(text):
+                return item, pattern
+        return None
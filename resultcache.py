@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dbpool import CircuitOpenError, pool_key
+from metrics import RESULT_CACHE_ENTRIES, RESULT_CACHE_REQUESTS
+
+
+# ---------------- Result Cache ----------------
+class CacheEntry:
+    __slots__ = ('value', 'loaded_at', 'inflight')
+
+    def __init__(self):
+        self.value = None
+        self.loaded_at = None
+        self.inflight = None
+
+
+class ResultCache:
+    """Results of database-backed loads, keyed by (database, query name, parameters).
+
+    - A result younger than `ttl` is returned as is.
+    - A result older than `ttl` but younger than `ttl + stale_ttl` is returned at once while one
+      refresh runs in the background (stale-while-revalidate).
+    - Anything older, or missing, is loaded; callers arriving while a load runs wait for that
+      load instead of starting their own (single-flight).
+    - While the database's circuit breaker is open, the last good result is served however old.
+    - At most `max_entries` results are kept; the least recently used idle entry goes first.
+
+    Bots that point at the same database share entries, so N bots cost one query per TTL, not N.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def key(db_config, query_name, params=()):
+        return pool_key(db_config), query_name, tuple(params or ())
+
+    async def get(self, db_config, query_name, params, loader, ttl, stale_ttl=0):
+        """Return the cached result of async loader(), loading it as the TTLs above require.
+
+        ttl=0 always reloads, but still joins a load that is already running.
+        """
+        key = self.key(db_config, query_name, params)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = CacheEntry()
+            self._evict()
+        else:
+            self.entries.move_to_end(key)
+
+        if entry.loaded_at is not None:
+            age = time.monotonic() - entry.loaded_at
+            if age < ttl:
+                RESULT_CACHE_REQUESTS.inc(query=query_name, result="hit")
+                return entry.value
+            if age < ttl + stale_ttl:
+                RESULT_CACHE_REQUESTS.inc(query=query_name, result="stale")
+                self._load(entry, query_name, loader)
+                return entry.value
+
+        RESULT_CACHE_REQUESTS.inc(query=query_name, result="coalesced" if entry.inflight else "miss")
+        try:
+            return await asyncio.shield(self._load(entry, query_name, loader))
+        except CircuitOpenError:
+            # The database is being left alone to recover; the last good result beats nothing
+            if entry.loaded_at is None:
+                raise
+            RESULT_CACHE_REQUESTS.inc(query=query_name, result="circuit_open")
+            return entry.value
+
+    def _load(self, entry, query_name, loader):
+        if entry.inflight is None:
+            entry.inflight = asyncio.ensure_future(loader())
+            entry.inflight.add_done_callback(lambda task: self._loaded(entry, query_name, task))
+        return entry.inflight
+
+    def _loaded(self, entry, query_name, task):
+        entry.inflight = None
+        if task.cancelled():
+            return
+        error = task.exception()
+        if isinstance(error, CircuitOpenError):
+            return  # Already logged once by the breaker when it opened
+        if error is not None:
+            # Waiting callers get the error too; this also covers background refreshes nobody awaits
+            logging.warning(f"Loading {query_name} failed: {type(error).__name__}: {error}")
+            return
+        entry.value = task.result()
+        entry.loaded_at = time.monotonic()
+
+    def _evict(self):
+        if len(self.entries) > self.max_entries:
+            for key in [key for key, entry in self.entries.items() if entry.inflight is None]:
+                del self.entries[key]
+                if len(self.entries) <= self.max_entries:
+                    break
+        RESULT_CACHE_ENTRIES.set(len(self.entries))
+
+    def invalidate(self, db_config=None, query_name=None):
+        """Forget results for a database and/or query name (everything when both are None)."""
+        database = pool_key(db_config) if db_config else None
+        for key in list(self.entries):
+            if (database is None or key[0] == database) and (query_name is None or key[1] == query_name):
+                if self.entries[key].inflight is None:
+                    del self.entries[key]
+        RESULT_CACHE_ENTRIES.set(len(self.entries))
+
+
+_result_cache = None
+
+
+def get_result_cache():
+    """Return the process-wide result cache shared by every bot's database-backed features."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache()
+    return _result_cache
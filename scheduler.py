@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from metrics import LOOP_DRIFT_SECONDS
+
+
+# ---------------- Job ----------------
+class Job:
+    """One periodic task. `interval` is seconds, or a callable returning the seconds until the next run.
+
+    A callable interval lets a job adapt its own pace (e.g. poll faster while a value is changing);
+    returning None stops the job.
+    """
+
+    def __init__(self, name, func, interval, jitter=0.1, backoff_group=None, max_backoff=300):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.backoff_group = backoff_group or name
+        self.max_backoff = max_backoff
+        self.next_run = time.monotonic()
+        self.running = False
+        self.runs = 0
+        self.last_duration = None
+        self.last_error = None
+        # Runs happen in the context of whoever added the job, so its logs carry that bot's name
+        self.context = contextvars.copy_context()
+
+    def base_interval(self):
+        return self.interval() if callable(self.interval) else self.interval
+
+
+# ---------------- Scheduler ----------------
+class Scheduler:
+    """Runs every periodic job in the process from one loop.
+
+    - A job never overlaps itself: its next run is planned when the current one finishes.
+    - Each run is spread by +/- `jitter` of its interval so jobs started together drift apart.
+    - Failures back off exponentially (interval * 2^failures, capped at max_backoff). Jobs in the
+      same backoff group, e.g. everything reading one database, share the failure count, so one
+      outage slows all of them and one success resets them.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.failures = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = {}
+
+    def add(self, name, func, interval, jitter=0.1, backoff_group=None, max_backoff=300, delay=0):
+        """Schedule async func() every interval seconds, first after `delay`. Replaces a job of the same name."""
+        self.remove(name)
+        job = self.jobs[name] = Job(name, func, interval, jitter, backoff_group, max_backoff)
+        job.next_run = time.monotonic() + delay
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def remove(self, name):
+        job = self.jobs.pop(name, None)
+        task = self._running.pop(name, None)
+        if task is not None:
+            task.cancel()
+        return job
+
+    def has(self, name):
+        return name in self.jobs
+
+    def _delay_after(self, job):
+        group_failures = self.failures.get(job.backoff_group, 0)
+        base = job.base_interval()
+        if base is None:
+            return None
+        if group_failures:
+            base = min(max(base, 1) * 2 ** group_failures, max(job.max_backoff, base))
+        return base * random.uniform(1 - job.jitter, 1 + job.jitter) if job.jitter else base
+
+    async def _run_job(self, job):
+        started = time.monotonic()
+        failed = False
+        try:
+            await job.func()
+            self.failures.pop(job.backoff_group, None)
+            job.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failed = True
+            self.failures[job.backoff_group] = self.failures.get(job.backoff_group, 0) + 1
+            job.last_error = f"{type(e).__name__}: {e}"
+            logging.error(f"Job {job.name} failed: {job.last_error}")
+        finally:
+            job.running = False
+            job.runs += 1
+            job.last_duration = time.monotonic() - started
+            self._running.pop(job.name, None)
+
+        if self.jobs.get(job.name) is not job:
+            return  # Removed or replaced while it ran
+        delay = self._delay_after(job)
+        if delay is None:
+            self.jobs.pop(job.name, None)
+            logging.info(f"Job {job.name} finished")
+            return
+        if failed:
+            logging.info(f"Job {job.name} retrying in {delay:.0f}s")
+        job.next_run = time.monotonic() + delay
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            now = time.monotonic()
+            next_due = None
+            for job in list(self.jobs.values()):
+                if job.running:
+                    continue
+                if job.next_run <= now:
+                    LOOP_DRIFT_SECONDS.set(round(now - job.next_run, 6), loop=job.name)
+                    job.running = True
+                    self._running[job.name] = asyncio.get_running_loop().create_task(self._run_job(job), context=job.context.copy())
+                elif next_due is None or job.next_run < next_due:
+                    next_due = job.next_run
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), None if next_due is None else next_due - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def close(self):
+        for name in list(self.jobs):
+            self.remove(name)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def status(self):
+        """Every job with its state, soonest first: (name, seconds until next run or None if running,
+        runs, failures in its backoff group, last duration, last error)."""
+        now = time.monotonic()
+        rows = [
+            (
+                job.name, None if job.running else max(0.0, job.next_run - now), job.runs,
+                self.failures.get(job.backoff_group, 0), job.last_duration, job.last_error
+            )
+            for job in self.jobs.values()
+        ]
+        rows.sort(key=lambda row: -1 if row[1] is None else row[1])
+        return rows
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    """Return the process-wide scheduler that every bot's periodic jobs run on."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler()
+    return _scheduler
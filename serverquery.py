@@ -0,0 +1,289 @@
+import asyncio
+import io
+import logging
+import socket
+import time
+from a2s.a2s_fragment import decode_fragment
+from a2s.byteio import ByteReader
+from a2s.exceptions import BrokenMessageError
+from a2s.info import InfoProtocol
+from metrics import A2S_QUERY_ERRORS, A2S_QUERY_SECONDS, A2S_QUERY_TIMEOUTS
+from scheduler import get_scheduler
+
+
+# ---------------- Server Snapshot ----------------
+class ServerSnapshot:
+    """The latest A2S_INFO result for one server and when it was taken."""
+
+    def __init__(self, info, timestamp):
+        self.info = info
+        self.timestamp = timestamp
+
+    @property
+    def online(self):
+        return self.info is not None
+
+    @property
+    def player_count(self):
+        return self.info.player_count if self.info else 0
+
+    @property
+    def max_players(self):
+        return self.info.max_players if self.info else 0
+
+    @property
+    def age(self):
+        return time.time() - self.timestamp
+
+
+# ---------------- Async A2S Client ----------------
+HEADER_SIMPLE = b"\xFF\xFF\xFF\xFF"
+HEADER_MULTI = b"\xFE\xFF\xFF\xFF"
+A2S_CHALLENGE_RESPONSE = 0x41
+MAX_CHALLENGE_RETRIES = 3
+
+
+class _A2SDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client):
+        self.client = client
+
+    def datagram_received(self, packet, addr):
+        self.client._packet_received(packet, addr[:2])
+
+    def error_received(self, exc):
+        logging.debug(f"A2S socket error: {exc}")
+
+
+class _PendingQuery:
+    def __init__(self, future):
+        self.future = future
+        self.sent_at = None
+        self.ping = None
+        self.retries = 0
+        self.fragments = []
+
+
+class A2SClient:
+    """Sends A2S_INFO queries for any number of servers over one shared UDP socket on the event loop."""
+
+    def __init__(self, max_concurrency=64, encoding='utf-8'):
+        self.encoding = encoding
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._transport_lock = asyncio.Lock()
+        self._transport = None
+        self._pending = {}
+        self._challenges = {}
+        self._resolved = {}
+
+    async def _ensure_transport(self):
+        async with self._transport_lock:
+            if self._transport is None or self._transport.is_closing():
+                loop = asyncio.get_running_loop()
+                self._transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _A2SDatagramProtocol(self), local_addr=('0.0.0.0', 0)
+                )
+        return self._transport
+
+    async def _resolve(self, address):
+        host, port = address
+        if address not in self._resolved:
+            loop = asyncio.get_running_loop()
+            infos = await loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            self._resolved[address] = infos[0][4][:2]
+        return self._resolved[address]
+
+    def _send(self, addr, pending, challenge):
+        if pending.sent_at is None:
+            pending.sent_at = time.monotonic()
+        self._transport.sendto(HEADER_SIMPLE + InfoProtocol.serialize_request(challenge), addr)
+
+    def _packet_received(self, packet, addr):
+        pending = self._pending.get(addr)
+        if pending is None or pending.future.done():
+            return
+        if pending.ping is None:
+            pending.ping = time.monotonic() - pending.sent_at
+        try:
+            header, payload = packet[:4], packet[4:]
+            if header == HEADER_MULTI:
+                pending.fragments.append(decode_fragment(payload))
+                if len(pending.fragments) < pending.fragments[0].fragment_count:
+                    return
+                pending.fragments.sort(key=lambda fragment: fragment.fragment_id)
+                payload = b"".join(fragment.payload for fragment in pending.fragments)
+                pending.fragments = []
+                if payload.startswith(HEADER_SIMPLE):
+                    payload = payload[4:]
+            elif header != HEADER_SIMPLE:
+                raise BrokenMessageError("Invalid packet header: " + repr(header))
+
+            reader = ByteReader(io.BytesIO(payload), endian="<", encoding=self.encoding)
+            response_type = reader.read_uint8()
+            if response_type == A2S_CHALLENGE_RESPONSE:
+                # Remember the challenge so the next query for this server needs only one round trip.
+                challenge = reader.read_uint32()
+                self._challenges[addr] = challenge
+                if pending.retries >= MAX_CHALLENGE_RETRIES:
+                    raise BrokenMessageError("Server keeps sending challenge responses")
+                pending.retries += 1
+                self._send(addr, pending, challenge)
+                return
+            if not InfoProtocol.validate_response_type(response_type):
+                raise BrokenMessageError("Invalid response type: " + hex(response_type))
+            pending.future.set_result(InfoProtocol.deserialize_response(reader, response_type, pending.ping))
+        except Exception as e:
+            pending.future.set_exception(e)
+
+    async def _query(self, address, timeout):
+        addr = await asyncio.wait_for(self._resolve(address), timeout)
+        pending = self._pending.get(addr)
+        if pending is not None:
+            return await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+
+        async with self._semaphore:
+            # The deadline starts once the packet can go out, so servers queued behind
+            # unresponsive ones are not timed out before they were even asked
+            await self._ensure_transport()
+            pending = _PendingQuery(asyncio.get_running_loop().create_future())
+            self._pending[addr] = pending
+            try:
+                self._send(addr, pending, self._challenges.get(addr, 0))
+                return await asyncio.wait_for(pending.future, timeout)
+            finally:
+                if self._pending.get(addr) is pending:
+                    del self._pending[addr]
+
+    async def info(self, address, timeout=5):
+        """Query one server; raises asyncio.TimeoutError if it doesn't answer within timeout seconds of being sent."""
+        return await self._query(address, timeout)
+
+    async def info_many(self, addresses, timeout=5):
+        """Query many servers at once; maps each address to its info or the exception it raised."""
+        results = await asyncio.gather(*(self.info(address, timeout) for address in addresses), return_exceptions=True)
+        return dict(zip(addresses, results))
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+_a2s_client = None
+
+
+def get_a2s_client():
+    """Return the process-wide A2S client shared by every poller."""
+    global _a2s_client
+    if _a2s_client is None:
+        _a2s_client = A2SClient()
+    return _a2s_client
+
+
+# ---------------- Server Poller ----------------
+class ServerPoller:
+    """Owns the A2S_INFO query for one server and pushes each snapshot to its subscribers.
+
+    Polling runs as a scheduler job at the shortest subscribed interval, adapted to the server:
+    twice as often while the player count is changing, half as often while it is empty or offline.
+    """
+
+    def __init__(self, ip, port, timeout=5, min_interval=15, max_interval=300):
+        self.address = (ip, port)
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.snapshot = None
+        self.previous_snapshot = None
+        self._inflight = None
+        self._subscribers = {}
+
+    @property
+    def interval(self):
+        if not self._subscribers:
+            return None
+        return min(self._subscribers.values())
+
+    def subscribe(self, callback, interval):
+        """Register an async callback(snapshot); the poller runs at the shortest subscribed interval."""
+        self._subscribers[callback] = interval
+
+    def unsubscribe(self, callback):
+        self._subscribers.pop(callback, None)
+        if not self._subscribers:
+            get_scheduler().remove(self.job_name)
+
+    @property
+    def job_name(self):
+        return f"a2s:{self.server_label}"
+
+    def next_interval(self):
+        """Seconds until the next poll, or None once nobody is subscribed."""
+        base = self.interval
+        if base is None or self.snapshot is None:
+            return base
+        snapshot, previous = self.snapshot, self.previous_snapshot
+        if not snapshot.online or snapshot.player_count == 0:
+            return max(base, min(base * 2, self.max_interval))
+        if previous is not None and previous.online and previous.player_count != snapshot.player_count:
+            return min(base, max(base / 2, self.min_interval))
+        return base
+
+    @property
+    def server_label(self):
+        return f"{self.address[0]}:{self.address[1]}"
+
+    async def _query(self):
+        started = time.perf_counter()
+        try:
+            info = await get_a2s_client().info(self.address, timeout=self.timeout)
+            A2S_QUERY_SECONDS.observe(time.perf_counter() - started, server=self.server_label)
+            return info
+        except asyncio.TimeoutError:
+            A2S_QUERY_TIMEOUTS.inc(server=self.server_label)
+            logging.warning(f"Server info query for {self.server_label} timed out after {self.timeout}s")
+            return None
+        except Exception as e:
+            A2S_QUERY_ERRORS.inc(server=self.server_label)
+            logging.error(f"Error fetching server info for {self.server_label}: {e}")
+            return None
+
+    async def _poll(self):
+        try:
+            info = await self._query()
+            self.previous_snapshot, self.snapshot = self.snapshot, ServerSnapshot(info, time.time())
+        finally:
+            self._inflight = None
+        await self._notify(self.snapshot)
+        return self.snapshot
+
+    async def _notify(self, snapshot):
+        callbacks = list(self._subscribers)
+        results = await asyncio.gather(*(callback(snapshot) for callback in callbacks), return_exceptions=True)
+        for callback, result in zip(callbacks, results):
+            if isinstance(result, Exception):
+                logging.error(f"Server poller subscriber {getattr(callback, '__qualname__', callback)} failed: {result}")
+
+    async def refresh(self):
+        """Query the server, joining a query that is already running instead of sending another."""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._poll())
+        return await asyncio.shield(self._inflight)
+
+    def start(self):
+        scheduler = get_scheduler()
+        if self._subscribers and not scheduler.has(self.job_name):
+            # No jitter: the interval is the dashboards' promised refresh rate
+            scheduler.add(self.job_name, self.refresh, self.next_interval, jitter=0)
+
+
+_pollers = {}
+
+
+def get_poller(ip, port, timeout=5):
+    """Return the process-wide poller for a server, creating it on first use."""
+    port = int(port) if port else None
+    key = (ip, port)
+    if key not in _pollers:
+        _pollers[key] = ServerPoller(ip, port, timeout=timeout)
+    return _pollers[key]
+